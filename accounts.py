@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from api_client import CrmClient
+from call_store import CallStore, store_path
+from reference import CACHE_DIR, CONFIG_DIR, ReferenceData
+from report import build_report, request_history
+from transport import ResponseArchive
+
+# Порядок затрат как в build_report
+COST_NAMES = ['personal', 'departments', 'subscription', 'number_cost', 'minutes']
+
+
+class Account:
+    """One DomRu PBX account with its own connection pool, phones, divisions, call store and recorded responses
+
+    cfg.json lists accounts as
+        "accounts": [{"name": "...", "token": "...", "path_to_api": "...",
+                      "config_dir": "config/<name>", "costs": {"minutes": 23000, ...}}]
+    Options outside the list (cache, max_workers, window_days) are shared by all accounts.
+    """
+
+    def __init__(self, config, defaults=None):
+        config = dict(defaults or {}, **config)
+        self.name = config['name']
+        self.costs = config.get('costs', {})
+        # Аккаунты одного CRM различаются только токеном, записанные ответы у каждого свои
+        self.client = CrmClient(config=config, archive=ResponseArchive(os.path.join(CACHE_DIR, self.name, 'responses')))
+        self.reference = ReferenceData(config.get('config_dir', os.path.join(CONFIG_DIR, self.name)), self.client)
+        self.store = CallStore(store_path(config.get('path_to_api', ''), os.path.join(CACHE_DIR, self.name)))
+
+    def report(self, history_params, costs):
+        """
+        :param history_params: arguments of request_history
+        :param costs: dict of default costs by COST_NAMES, account costs override them
+        :return: report dataframe of account
+        """
+        costs = dict(costs, **self.costs)
+        call_history = request_history(client=self.client, store=self.store,
+                                       numbers=self.reference.phones['number'], **history_params)
+        return build_report(call_history, *(costs[name] for name in COST_NAMES), reference=self.reference)
+
+
+def load_accounts(path=None):
+    """
+    :return: list of accounts from cfg.json, empty when it has a single token
+    """
+    with open(path or os.path.join(CONFIG_DIR, 'cfg.json'), 'r') as f:
+        config = json.load(f)
+    defaults = {key: value for key, value in config.items() if key != 'accounts'}
+    return [Account(account, defaults) for account in config.get('accounts', [])]
+
+
+def account_reports(accounts, history_params, costs, on_result=None):
+    """
+    Reports of all accounts, accounts are requested concurrently
+    :param on_result: called with (account, report, seconds) or (account, exception, seconds) as soon as it is ready
+    :return: dict name -> report, failed accounts are left out
+    """
+    reports = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(len(accounts), 1)) as pool:
+        futures = {pool.submit(account.report, history_params, costs): account for account in accounts}
+        for future in as_completed(futures):
+            account = futures[future]
+            try:
+                result = reports[account.name] = future.result()
+            except Exception as e:
+                result = e
+            if on_result is not None:
+                on_result(account, result, time.perf_counter() - started)
+    # Порядок как в cfg.json
+    return {account.name: reports[account.name] for account in accounts if account.name in reports}
+
+
+def consolidate(reports):
+    """
+    One report of all accounts
+    :param reports: dict name -> report
+    :return: dataframe with column 'Аккаунт' before report columns
+    """
+    frames = [report.assign(Аккаунт=name) for name, report in reports.items()]
+    df = pd.concat(frames, ignore_index=True)
+    return df[['Аккаунт'] + [column for column in df.columns if column != 'Аккаунт']]
+
+
+def write_consolidated(reports, path):
+    """Write consolidated report, xlsx also gets one sheet per account"""
+    total = consolidate(reports)
+    if path.lower().endswith('.csv'):
+        total.to_csv(path, encoding='utf-8-sig', sep=';', index=False)
+        return
+    if path.lower().endswith('.parquet'):
+        total.to_parquet(path, index=False)
+        return
+    with pd.ExcelWriter(path) as writer:
+        total.to_excel(writer, sheet_name='Итого', index=False)
+        for name, report in reports.items():
+            report.to_excel(writer, sheet_name=name[:31], index=False)
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from tracing import traced
+
+
+class NumberIndex:
+    """Phone number -> division index built once from phones.csv
+
+    Every row of phones gets a dense division code, so call durations are
+    summed by numbers and divisions with numpy.bincount instead of groupby and merge.
+    """
+
+    def __init__(self, phones):
+        self.numbers = pd.Index(phones['number'].astype(str))
+        self.division_codes, self.division_ids = pd.factorize(phones['division_id'], sort=True)
+        # Количество номеров в подразделении
+        self.numbers_per_division = np.bincount(self.division_codes, minlength=len(self.division_ids))
+
+    def number_codes(self, diversion):
+        """
+        Dense codes of call numbers
+        :param diversion: column of called numbers, categorical or strings
+        :return: tuple (codes, categories), code -1 means empty number
+        """
+        if isinstance(diversion.dtype, pd.CategoricalDtype):
+            return diversion.cat.codes.to_numpy(), pd.Index(diversion.cat.categories.astype(str))
+        codes, categories = pd.factorize(diversion.astype(str))
+        return codes, pd.Index(categories)
+
+    def call_division_codes(self, diversion):
+        """
+        Division code of every call
+        :param diversion: column of called numbers
+        :return: array of division codes, -1 for numbers missing in phones
+        """
+        codes, categories = self.number_codes(diversion)
+        phone_codes = categories.get_indexer(self.numbers)
+        known = phone_codes >= 0
+        category_divisions = np.full(len(categories) + 1, -1, dtype=np.int64)
+        category_divisions[phone_codes[known]] = self.division_codes[known]
+        # код -1 попадает в последний элемент, он всегда -1
+        return category_divisions[codes]
+
+    def seconds_by_division(self, diversion, duration):
+        """
+        Sum duration of calls by divisions
+        :return: tuple (seconds, has_calls) arrays by division codes
+        """
+        codes, categories = self.number_codes(diversion)
+        duration = np.asarray(duration)
+        if (codes < 0).any():
+            valid = codes >= 0
+            codes, duration = codes[valid], duration[valid]
+        seconds = np.bincount(codes, weights=duration, minlength=len(categories))
+        calls = np.bincount(codes, minlength=len(categories))
+        # Номер из phones.csv -> код номера в истории звонков
+        phone_codes = categories.get_indexer(self.numbers)
+        known = phone_codes >= 0
+        phone_seconds = np.where(known, seconds[phone_codes], 0)
+        phone_calls = np.where(known, calls[phone_codes], 0)
+        division_seconds = np.bincount(self.division_codes, weights=phone_seconds, minlength=len(self.division_ids))
+        division_calls = np.bincount(self.division_codes, weights=known & (phone_calls > 0),
+                                     minlength=len(self.division_ids))
+        return np.rint(division_seconds).astype(np.int64), division_calls > 0
+
+
+@traced('aggregate')
+def aggregate_by_division(index, call_history, number_cost, conversation_cost):
+    """
+    Cost of calls and numbers by divisions
+    :param index: NumberIndex of phones
+    :param call_history: dataframe with diversion and duration of calls
+    :param number_cost: cost for one number
+    :param conversation_cost: total cost for all calls
+    :return: dataframe with columns id, duration, cost_for_calls, cost_for_numbers
+    """
+    seconds, has_calls = index.seconds_by_division(call_history['diversion'], call_history['duration'])
+    ids = np.asarray(index.division_ids)[has_calls]
+    duration = seconds[has_calls]
+    # Считаем стоимость секунды
+    sec_cost = conversation_cost / duration.sum()
+    return pd.DataFrame({'id': ids,
+                         'duration': duration,
+                         'cost_for_calls': np.round(duration * sec_cost, 2),
+                         'cost_for_numbers': index.numbers_per_division[has_calls] * number_cost})
+
+
+class CallIndex:
+    """Positions of calls grouped by division, built once for fetched call history"""
+
+    def __init__(self, index, call_history):
+        self.index = index
+        codes = index.call_division_codes(call_history['diversion'])
+        self.order = np.argsort(codes, kind='stable')
+        self.bounds = np.searchsorted(codes[self.order], np.arange(-1, len(index.division_ids) + 1))
+
+    def rows(self, division_id):
+        """
+        :param division_id: id of division from divisions.csv
+        :return: positions of division calls in call history
+        """
+        if division_id not in self.index.division_ids:
+            return self.order[:0]
+        code = self.index.division_ids.get_loc(division_id) + 1
+        return self.order[self.bounds[code]:self.bounds[code + 1]]
+
+
+def division_details(call_history, rows):
+    """
+    Calls of division by numbers, by days and one by one
+    :param call_history: typed call history
+    :param rows: positions of division calls, see CallIndex.rows
+    :return: tuple of dataframes (numbers, days, calls)
+    """
+    calls = call_history.iloc[rows]
+    minutes = lambda seconds: (seconds / 60).round(2)
+    numbers = calls.groupby('diversion', observed=True).duration.agg(['count', 'sum']).reset_index()
+    numbers.columns = ['Номер', 'Звонков', 'Секунд']
+    numbers['Минут'] = minutes(numbers['Секунд'])
+    days = calls.groupby(calls['start'].dt.date).duration.agg(['count', 'sum']).reset_index()
+    days.columns = ['День', 'Звонков', 'Секунд']
+    days['Минут'] = minutes(days['Секунд'])
+    calls = calls[['start', 'diversion', 'duration']].sort_values('start').reset_index(drop=True)
+    calls.columns = ['Начало', 'Номер', 'Секунд']
+    return numbers, days, calls
+
+
+def number_totals(call_history, phones):
+    """
+    Calls of every number from phones.csv, numbers without calls are kept
+    :param call_history: typed call history
+    :param phones: dataframe with columns number, division_id, description
+    :return: dataframe with columns division_id, Номер, Описание, Звонков, Секунд, Минут
+    """
+    totals = call_history.groupby('diversion', observed=True).duration.agg(['count', 'sum'])
+    totals.index = totals.index.astype(str)
+    totals = totals.reindex(phones['number'].astype(str), fill_value=0)
+    numbers = pd.DataFrame({'division_id': phones['division_id'].to_numpy(),
+                            'Номер': phones['number'].astype(str).to_numpy(),
+                            'Описание': phones['description'].to_numpy(),
+                            'Звонков': totals['count'].to_numpy(),
+                            'Секунд': totals['sum'].to_numpy()})
+    numbers['Минут'] = (numbers['Секунд'] / 60).round(2)
+    return numbers
@@ -0,0 +1,218 @@
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from reference import CONFIG_DIR
+from tracing import span
+from transport import MODES, PASSTHROUGH, RECORD, REPLAY, ResponseArchive, replayed_response
+
+HISTORY = '/crmapi/v1/history/json'
+USERS = '/crmapi/v1/users'
+
+# (connect, read) timeouts in seconds
+TIMEOUTS = {HISTORY: (5, 120),
+            USERS: (5, 15)}
+DEFAULT_TIMEOUT = (5, 30)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CrmApiError(Exception):
+    """CRM API did not answer successfully after all retries"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        # Retry-After последнего ответа CRM, если он был
+        self.retry_after = retry_after
+
+
+class AdaptiveLimit:
+    """Concurrency limit which halves on 429 and grows by one after each round of successes"""
+
+    def __init__(self, limit, minimum=1):
+        self.limit = float(limit)
+        self.maximum = limit
+        self.minimum = minimum
+        self.active = 0
+        self._cond = threading.Condition()
+
+    def __enter__(self):
+        with self._cond:
+            while self.active >= int(self.limit):
+                self._cond.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, *exc):
+        with self._cond:
+            self.active -= 1
+            if exc[0] is None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def throttle(self):
+        with self._cond:
+            self.limit = max(self.minimum, self.limit / 2)
+
+
+class CrmClient:
+    """Client for DomRu CRM API with pooled keep-alive connections
+
+    Config is read once, every request goes through one requests.Session,
+    429 and 5xx answers are retried with jittered exponential backoff.
+    In record mode successful responses are also saved to ResponseArchive,
+    in replay mode they are served from it and the network is never used.
+    Concurrent history windows of all callers share one AdaptiveLimit
+    of pool_size, so nested thread pools never exceed the connection pool.
+    """
+
+    def __init__(self, config_path=None, retries=4, backoff=0.5, max_backoff=30, pool_size=8, config=None,
+                 transport=None, archive=None):
+        self.config_path = config_path or os.path.join(CONFIG_DIR, 'cfg.json')
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        # config передается для аккаунтов, описанных внутри cfg.json
+        self._config = config
+        self._transport = transport
+        self.archive = archive or ResponseArchive()
+        self._session = None
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'errors': 0, 'latency': 0.0, 'replayed': 0}
+        self.limit = AdaptiveLimit(pool_size)
+
+    @property
+    def config(self):
+        with self._lock:
+            if self._config is None:
+                with span('config', file=self.config_path), open(self.config_path, 'r') as f:
+                    self._config = json.load(f)
+            return self._config
+
+    @property
+    def transport(self):
+        """
+        passthrough, record or replay: argument of client, DOMRU_TRANSPORT or 'transport' of cfg.json
+        """
+        mode = self._transport or os.environ.get('DOMRU_TRANSPORT') or self.config.get('transport') or PASSTHROUGH
+        if mode not in MODES:
+            raise ValueError(f'Unknown transport {mode}, expected one of {", ".join(MODES)}')
+        return mode
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def wait_before_retry(self, attempt, retry_after=None):
+        """
+        Count a retry and sleep before it
+        :param attempt: number of the failed attempt, from 0
+        :param retry_after: Retry-After header of CRM answer, jittered exponential backoff without it
+        """
+        self._count('retries')
+        if retry_after and str(retry_after).isdigit():
+            delay = float(retry_after)
+        else:
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        time.sleep(delay)
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self.stats[key] += value
+
+    def get(self, endpoint, params=None, stream=False, retries=None):
+        """
+        GET request to CRM API with retries, or recorded response in replay mode
+        :param endpoint: path of endpoint such as HISTORY or USERS
+        :param params: query parameters
+        :param stream: do not read response body at once, ignored in record and replay modes
+        :param retries: number of retries instead of the client default
+        :return: successful response
+        """
+        mode = self.transport
+        base_url = self.config.get('path_to_api', '')
+        if mode == REPLAY:
+            with span('replay', endpoint=endpoint, params=params):
+                body = self.archive.load(base_url, endpoint, params)
+            if body is None:
+                self._count('errors')
+                # Как 404: записи нет, повторять запрос бессмысленно
+                raise CrmApiError(f'{endpoint}: no recorded response for {params}', 404)
+            self._count('replayed')
+            return replayed_response(body, base_url + endpoint)
+        response = self._request(endpoint, params, stream, retries)
+        if mode == RECORD:
+            # Ответ читается целиком, iter_content и json потом берут его из памяти
+            self.archive.save(base_url, endpoint, params, response.content)
+        return response
+
+    def _request(self, endpoint, params, stream, retries):
+        config = self.config
+        url = config['path_to_api'] + endpoint
+        headers = {'X-API-KEY': config['token']}
+        timeout = TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+        retries = self.retries if retries is None else retries
+        status = None
+        for attempt in range(retries + 1):
+            started = time.perf_counter()
+            response = None
+            try:
+                with span('http', endpoint=endpoint, params=params, attempt=attempt) as s:
+                    response = self.session.get(url, headers=headers, params=params, timeout=timeout, stream=stream)
+                    s.set(status=response.status_code)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            finally:
+                self._count('requests')
+                self._count('latency', time.perf_counter() - started)
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                status = response.status_code
+                error = f'HTTP {status}'
+                response.close()
+            retry_after = response.headers.get('Retry-After') if response is not None else None
+            if attempt == retries:
+                break
+            self.wait_before_retry(attempt, retry_after)
+        self._count('errors')
+        raise CrmApiError(f'{endpoint}: {error}', status, retry_after)
+
+    def history(self, params):
+        return self.get(HISTORY, params).json()
+
+    def users(self):
+        return self.get(USERS).json()
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Shared CRM client, created on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CrmClient()
+        return _client
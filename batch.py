@@ -0,0 +1,91 @@
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from history import API_DATE_FORMAT
+from reference import REFERENCE
+from report import build_report, request_history
+
+
+def parse_months(text):
+    """
+    :param text: months as '2024-01,2024-03' or range '2024-01:2024-12'
+    :return: list of first days of months
+    """
+    months = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition(':')
+        month = datetime.date.fromisoformat(first + '-01')
+        last = datetime.date.fromisoformat((last or first) + '-01')
+        while month <= last:
+            months.append(month)
+            month = (month + datetime.timedelta(days=32)).replace(day=1)
+    return months
+
+
+def month_bounds(month):
+    """First and last moment of month in API date format"""
+    next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+    start = datetime.datetime.combine(month, datetime.time.min)
+    end = datetime.datetime.combine(next_month, datetime.time.min) - datetime.timedelta(seconds=1)
+    return start.strftime(API_DATE_FORMAT), end.strftime(API_DATE_FORMAT)
+
+
+def fetch_months(months, max_workers=4, refresh=False):
+    """
+    Fetch call history of every month concurrently
+    :param refresh: request closed days of the local store again
+    :return: list of dataframes in order of months
+    """
+    def fetch(month):
+        start, end = month_bounds(month)
+        return request_history(start_date_=start, end_date=end, period='', refresh=refresh)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(fetch, months))
+
+
+def _init_worker(phones, divisions):
+    # Справочники загружены в родительском процессе, CRM из процессов не запрашивается
+    REFERENCE.preload(phones, divisions)
+
+
+def _month_report(month, call_history, costs, folder):
+    report = build_report(call_history, *costs)
+    report.to_excel(os.path.join(folder, f'Домру_{month:%Y.%m}.xlsx'), index=False)
+    return report
+
+
+def generate_reports(months, costs, folder, max_workers=None, refresh=False):
+    """
+    Reports for many months: one workbook per month and summary.xlsx with totals by divisions and months
+    :param months: list of first days of months
+    :param costs: tuple (personal, departments, subscription, number cost, minutes) as in build_report
+        or dict month -> tuple
+    :param folder: folder for workbooks
+    :param max_workers: number of processes for calculations
+    :param refresh: request closed days of the local store again
+    :return: dict with timings of stages in seconds
+    """
+    os.makedirs(folder, exist_ok=True)
+    timings = {}
+    started = time.perf_counter()
+    histories = fetch_months(months, refresh=refresh)
+    timings['fetch'] = time.perf_counter() - started
+    stage = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(REFERENCE.phones, REFERENCE.divisions)) as pool:
+        futures = [pool.submit(_month_report, month, history, costs[month] if isinstance(costs, dict) else costs,
+                               folder)
+                   for month, history in zip(months, histories)]
+        reports = [future.result() for future in futures]
+    timings['reports'] = time.perf_counter() - stage
+    summary = pd.concat([report.assign(Месяц=f'{month:%Y.%m}') for month, report in zip(months, reports)])
+    summary = summary.pivot_table(index='Отдел', columns='Месяц', values='Общая сумма', aggfunc='sum')
+    summary['Итого'] = summary.sum(axis=1)
+    summary.reset_index().to_excel(os.path.join(folder, 'summary.xlsx'), sheet_name='Итого', index=False)
+    timings['total'] = time.perf_counter() - started
+    return timings
@@ -0,0 +1,69 @@
+"""calculate_expenses_by_numbers2: pandas groupby/merge chain against the bincount kernel
+
+Run: python benchmarks/bench_aggregation.py [sizes...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from aggregation import aggregate_by_division
+from reference import REFERENCE
+
+SIZES = [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7, 5 * 10 ** 7]
+
+
+def pandas_chain(call_history, number_cost, conversation_cost, phones):
+    """Previous implementation of calculate_expenses_by_numbers2"""
+    temp = phones.division_id.value_counts().reset_index()
+    temp.columns = ['division_id', 'cost_for_number']
+    temp.cost_for_number = temp.cost_for_number * number_cost
+    number_seconds = call_history.groupby('diversion', observed=True).duration.sum().reset_index()
+    number_seconds.rename(columns={"diversion": "number"}, inplace=True)
+    number_seconds['number'] = number_seconds['number'].astype(str)
+    phone_division = phones.merge(number_seconds, on='number')
+    division_duration = phone_division.groupby('division_id').duration.sum().reset_index()
+    sec_cost = conversation_cost / division_duration.duration.sum()
+    division_duration['cost_for_calls'] = round(division_duration['duration'].astype(int) * sec_cost, 2)
+    merged = division_duration.merge(temp, on='division_id')
+    merged.columns = ['id', 'duration', 'cost_for_calls', 'cost_for_numbers']
+    return merged
+
+
+def synthetic_calls(n, numbers, seed=0):
+    rng = np.random.default_rng(seed)
+    # 10% звонков с номеров, которых нет в phones.csv
+    categories = list(numbers) + [f'7999{i:07d}' for i in range(len(numbers))]
+    codes = rng.integers(0, len(numbers), n)
+    unknown = rng.random(n) < 0.1
+    codes[unknown] = rng.integers(len(numbers), len(categories), unknown.sum())
+    return pd.DataFrame({'diversion': pd.Categorical.from_codes(codes, categories),
+                         'duration': rng.integers(1, 900, n, dtype=np.int32)})
+
+
+def timed(fn, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+if __name__ == '__main__':
+    sizes = [int(float(x)) for x in sys.argv[1:]] or SIZES
+    phones = REFERENCE.phones
+    index = REFERENCE.number_index
+    print(f'{"calls":>10} {"pandas, s":>10} {"bincount, s":>12} {"speedup":>8}')
+    for n in sizes:
+        calls = synthetic_calls(n, phones['number'].unique())
+        t_old, old = timed(pandas_chain, calls, 160.0, 23000.0, phones)
+        t_new, new = timed(aggregate_by_division, index, calls, 160.0, 23000.0)
+        # groupby оставляет int32 у суммы длительностей, ядро считает в int64
+        assert_frame_equal(old, new, check_dtype=False)
+        print(f'{n:>10} {t_old:>10.4f} {t_new:>12.4f} {t_old / t_new:>7.1f}x')
@@ -0,0 +1,30 @@
+"""Memory of call history per million calls: json_normalize object columns against CALL_SCHEMA
+
+Run: python benchmarks/bench_call_memory.py [calls]
+"""
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from stub_server import make_history
+
+from history import CALL_COLUMNS, typed_calls
+from reference import REFERENCE
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    numbers = REFERENCE.phones['number'].tolist()
+    history = make_history(n, datetime.datetime(2024, 1, 1), 31, numbers)
+    raw = pd.json_normalize(history).astype(object)
+    del history
+    raw = raw.query('status == "success"')
+    typed = typed_calls(raw[CALL_COLUMNS], numbers)
+    scale = 10 ** 6 / len(raw)
+    for name, df in (('json_normalize, object', raw), ('projected, object', raw[CALL_COLUMNS]), ('CALL_SCHEMA', typed)):
+        size = df.memory_usage(deep=True).sum() * scale
+        print(f'{name:>24}: {size / 2 ** 20:8.1f} MiB per million calls')
+    for column, size in typed.memory_usage(deep=True, index=False).items():
+        print(f'{column:>24}: {size * scale / 2 ** 20:8.1f} MiB')
@@ -0,0 +1,54 @@
+"""Workbook per division: filtering calls for every division and to_excel against export_divisions
+
+Run: python benchmarks/bench_division_files.py [calls] [divisions]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from synthetic import make_calls, make_reference
+
+from export import export_divisions
+from report import build_report
+
+
+def old_fan_out(folder, report, calls, reference):
+    """Cut the report by hand: filter calls of every division again"""
+    phones, divisions = reference.phones, reference.divisions
+    for _, row in report.iterrows():
+        division_id = divisions.loc[divisions['name'] == row['Отдел'], 'id'].iloc[0]
+        numbers = phones[phones['division_id'] == division_id]
+        division_calls = calls[calls['diversion'].astype(str).isin(numbers['number'])]
+        with pd.ExcelWriter(os.path.join(folder, f'{division_id}.xlsx')) as excel:
+            row.to_frame().T.to_excel(excel, sheet_name='Итого', index=False)
+            numbers.to_excel(excel, sheet_name='Номера', index=False)
+            division_calls.assign(start=division_calls['start'].dt.tz_convert(None)).to_excel(
+                excel, sheet_name='Звонки', index=False)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    divisions = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    reference = make_reference(divisions)
+    calls = make_calls(n)
+    numbers = reference.phones['number'].tolist()
+    calls['diversion'] = pd.Categorical.from_codes(np.random.default_rng(1).integers(0, len(numbers), n), numbers)
+    report = build_report(calls, 10600, 900, 4500, 160, 23000, reference=reference)
+    print(f'{n} calls, {divisions} divisions, {os.cpu_count()} CPUs')
+    for name, run in (('filter + to_excel', lambda folder: old_fan_out(folder, report, calls, reference)),
+                      ('export_divisions, 1 process',
+                       lambda folder: export_divisions(folder, report, calls, reference, max_workers=1)),
+                      ('export_divisions, pool', lambda folder: export_divisions(folder, report, calls, reference))):
+        with tempfile.TemporaryDirectory() as folder:
+            started = time.perf_counter()
+            run(folder)
+            print(f'{name:>28}: {time.perf_counter() - started:6.1f} s, {len(os.listdir(folder))} files')
+
+
+if __name__ == '__main__':
+    main()
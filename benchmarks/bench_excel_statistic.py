@@ -0,0 +1,45 @@
+"""Reading a year of DomRu Excel exports: one by one with apply(to_seconds) against the parallel folder mode
+
+Run: python benchmarks/bench_excel_statistic.py [calls per month]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from synthetic import write_export
+
+from excel_statistic import read_tel_statistic_folder, to_seconds
+
+
+def old_path(folder):
+    """Previous read_tel_excel_statistic applied to every file"""
+    frames = []
+    for name in sorted(os.listdir(folder)):
+        df = pd.read_excel(os.path.join(folder, name), skiprows=[0, 1, 2, 3, 4, 5, 6, 7, 8], dtype={'Через': 'str'})
+        df.drop_duplicates(inplace=True)
+        df['duration'] = df['Длительность'].apply(to_seconds)
+        db = df[['Дата', 'Тип звонка', 'Через', 'duration', 'Клиент']]
+        db.columns = ['date', 'type', 'number', 'duration', 'caller']
+        frames.append(db)
+    return pd.concat(frames, ignore_index=True)
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    numbers = ['78312148909', '78312150073', '78312150093', '78312825526']
+    with tempfile.TemporaryDirectory() as folder:
+        for month in range(1, 13):
+            write_export(os.path.join(folder, f'{month:02d}.xlsx'), month, calls, numbers, month)
+        total = 12 * calls
+        print(f'12 exports, {total} calls')
+        for name, fn in (('one by one, apply', old_path),
+                         ('folder, 1 process', lambda f: read_tel_statistic_folder(f, max_workers=1)),
+                         ('folder, process pool', read_tel_statistic_folder)):
+            started = time.perf_counter()
+            df = fn(folder)
+            elapsed = time.perf_counter() - started
+            print(f'{name:>22}: {elapsed:6.2f} s, {total / elapsed:8.0f} calls/s, {len(df)} rows')
@@ -0,0 +1,53 @@
+"""Export of report with call detail: DataFrame.to_excel against streaming write-only workbook, CSV and Parquet
+
+Peak RSS growth is measured in a fresh process for every writer (Linux only).
+Run: python benchmarks/bench_export.py [calls] [.xlsx .csv .parquet]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from suite import reset_peak, status_mib
+from synthetic import make_calls
+
+
+def run(writer, n, folder):
+    """Export in this process, prints seconds and peak RSS growth"""
+    from report import build_report
+    from export import export_report
+    calls = make_calls(n)
+    report = build_report(calls, 10600, 900, 4500, 160, 23000)
+    reset_peak()
+    before = status_mib('VmRSS')
+    started = time.perf_counter()
+    if writer == 'to_excel':
+        with pd.ExcelWriter(os.path.join(folder, 'old.xlsx')) as excel:
+            report.to_excel(excel, sheet_name='Итого', index=False)
+            calls.assign(start=calls['start'].dt.tz_convert(None)).to_excel(excel, sheet_name='Звонки', index=False)
+    else:
+        export_report(os.path.join(folder, 'report' + writer), report, calls)
+    seconds = time.perf_counter() - started
+    peak = status_mib('VmHWM')
+    print(f'{writer:>10}: {seconds:7.1f} s, peak RSS +{max(peak - before, 0):7.1f} MiB')
+
+
+def main():
+    if len(sys.argv) > 3 and sys.argv[1] == '--run':
+        run(sys.argv[2], int(sys.argv[3]), sys.argv[4])
+        return
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    print(f'{n} calls')
+    with tempfile.TemporaryDirectory() as folder:
+        # Старый способ держит всю книгу в памяти, на миллионах звонков его не ждем
+        writers = (['to_excel'] if n <= 1048575 else []) + (sys.argv[2:] or ['.xlsx', '.csv', '.parquet'])
+        for writer in writers:
+            subprocess.run([sys.executable, __file__, '--run', writer, str(n), folder], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""Peak memory and throughput of history parsing: r.json() + json_normalize against streaming read_calls
+
+Run: python benchmarks/bench_history_parse.py [calls]
+"""
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+from stub_server import make_history
+
+from history import CHUNK_SIZE, read_calls
+
+
+def chunks_of(payload):
+    for i in range(0, len(payload), CHUNK_SIZE):
+        yield payload[i:i + CHUNK_SIZE]
+
+
+def old_path(payload):
+    body = b''.join(chunks_of(payload))
+    df = pd.json_normalize(json.loads(body))
+    return df.query('status == "success"')
+
+
+def new_path(payload):
+    return read_calls(chunks_of(payload))
+
+
+def measure(fn, payload):
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = fn(payload)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(df)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    history = make_history(n, datetime.datetime(2024, 1, 1), 31, ['78312148909', '78312150073', '78312150093'])
+    payload = json.dumps(history).encode()
+    del history
+    print(f'{n} calls, {len(payload) / 2 ** 20:.1f} MiB of JSON')
+    for name, fn in (('r.json + json_normalize', old_path), ('streaming read_calls', new_path)):
+        elapsed, peak, rows = measure(fn, payload)
+        print(f'{name:>24}: {elapsed:6.2f} s, {n / elapsed:9.0f} calls/s, peak {peak / 2 ** 20:7.1f} MiB, {rows} rows')
@@ -0,0 +1,72 @@
+"""Classifying line items of 100 invoices: chain of substring checks against compiled rules, next to PDF extraction
+
+Run: python benchmarks/bench_invoice_classifier.py [invoices] [pages]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_invoice_pdf import write_invoice
+from invoice_pdf import extract_invoice_rows
+from reference import REFERENCE
+
+
+def old_costs(table):
+    """Previous costs_from_invoice loop"""
+    divisions_cost = 0
+    personal_cost = 0
+    subscription_cost = 0
+    minutes_cost = 0
+    for row in table:
+        if not row[0] or not row[1]:
+            continue
+        value = row[1].replace(',', '.').replace(' ', '')
+        if 'Дополнительная группа пользователей' in row[0]:
+            divisions_cost += float(value)
+        if 'Дополнительные внутренние номера' in row[0]:
+            personal_cost += float(value)
+        if 'Безлимитная запись' in row[0] or \
+                'ОАТС Про' in row[0] or \
+                'Интеграция с CRM' in row[0] or \
+                'Алгоритм распред' in row[0]:
+            subscription_cost += float(value)
+        if 'Минут' in row[0] or 'Соединения по сети передачи данных' in row[0]:
+            minutes_cost += float(value)
+    return {'divisions': divisions_cost,
+            'personal': personal_cost,
+            'subscription': subscription_cost,
+            'minutes': minutes_cost}
+
+
+def main():
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'invoice.pdf')
+        write_invoice(path, pages, 30)
+        started = time.perf_counter()
+        rows = extract_invoice_rows(path, max_workers=1, cache=False)
+        pdf_time = time.perf_counter() - started
+    # Ячейки без текста, как на стыке страниц
+    rows = rows + [[None, None, None], ['Аренда оборудования', None]]
+    classifier = REFERENCE.invoice_classifier
+    started = time.perf_counter()
+    for _ in range(invoices):
+        old = old_costs(rows)
+    old_time = time.perf_counter() - started
+    started = time.perf_counter()
+    for _ in range(invoices):
+        new, unmatched = classifier.classify(rows)
+    new_time = time.perf_counter() - started
+    for cost in old:
+        assert abs(old[cost] - new[cost]) < 0.01, cost
+    print(f'{invoices} invoices of {len(rows)} rows, {len(unmatched)} unmatched rows per invoice')
+    print(f'PDF extraction:      {pdf_time * invoices:6.2f} s')
+    print(f'substring checks:    {old_time:6.3f} s')
+    print(f'compiled rules:      {new_time:6.3f} s')
+
+
+if __name__ == '__main__':
+    main()
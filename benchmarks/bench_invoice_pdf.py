@@ -0,0 +1,139 @@
+"""Invoice extraction: first page only as before against all pages cropped to line items, in processes and cached
+
+Run: python benchmarks/bench_invoice_pdf.py [pages] [items per page]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdfminer.glyphlist import glyphname2unicode
+
+from invoice_pdf import InvoiceCache, extract_invoice_rows
+
+ITEMS = ['Дополнительная группа пользователей', 'Дополнительные внутренние номера', 'Безлимитная запись разговоров',
+         'ОАТС Про', 'Интеграция с CRM', 'Алгоритм распределения вызовов', 'Минуты местной связи',
+         'Соединения по сети передачи данных', 'Аренда оборудования']
+# Кириллица кодируется байтами 128-255 через Differences, pdfminer восстанавливает буквы по именам глифов
+GLYPHS = {char: name for name, char in glyphname2unicode.items() if len(char) == 1 and 'А' <= char <= 'я' or char in 'Ёё№'}
+CODES = {char: 128 + i for i, char in enumerate(sorted(GLYPHS))}
+
+
+def pdf_string(text):
+    data = bytes(CODES.get(char, ord(char) if ord(char) < 128 else 63) for char in text)
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def text(x, y, value, size=9):
+    return b'BT /F1 %d Tf %d %d Td ' % (size, x, y) + pdf_string(value) + b' Tj ET\n'
+
+
+def page_content(rnd, number, items, amounts):
+    """Invoice page: requisites above, table of line items with ruling, terms below"""
+    out = [text(40, 800, f'Счет № {1000 + number} ООО Новые Телесистемы-ТВ', 12)]
+    out += [text(40, 780 - 11 * i, f'Реквизиты плательщика, строка {i} ИНН 5260000000 КПП 526001001') for i in range(12)]
+    columns = [40, 360, 440, 555]
+    top = 630
+    rows = [('Наименование услуги', 'Сумма', 'НДС')] + items + [('Итого', '', '')]
+    for i, row in enumerate(rows):
+        y = top - 16 * i
+        for x, value in zip(columns, row):
+            out.append(text(x + 3, y - 12, value))
+        if row[1] and row[0] != 'Итого' and i:
+            amounts.append(row)
+    bottom = top - 16 * len(rows)
+    for i in range(len(rows) + 1):
+        out.append(b'%d %d m %d %d l S\n' % (columns[0], top - 16 * i, columns[-1], top - 16 * i))
+    for x in columns:
+        out.append(b'%d %d m %d %d l S\n' % (x, top, x, bottom))
+    out += [text(40, bottom - 20 - 10 * i, 'Условия оплаты и порядок расчетов по договору оказания услуг связи '
+                                             f'{rnd.randrange(10 ** 6)}', 7) for i in range((bottom - 60) // 10)]
+    return b''.join(out)
+
+
+def write_invoice(path, pages, items_per_page, seed=1):
+    """
+    Minimal PDF in the layout of DomRu invoice without PDF libraries
+    :return: list of (name, amount, vat) rows put into the tables
+    """
+    rnd = random.Random(seed)
+    amounts = []
+    contents = []
+    for number in range(pages):
+        items = []
+        for _ in range(items_per_page):
+            amount = rnd.randrange(100, 500000) / 100
+            items.append((rnd.choice(ITEMS), f'{amount:,.2f}'.replace(',', ' ').replace('.', ','), '20%'))
+        contents.append(page_content(rnd, number, items, amounts))
+    differences = b' '.join(b'/' + GLYPHS[char].encode() for char in sorted(GLYPHS))
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>',
+               b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+                   b' '.join(b'%d 0 R' % (4 + 2 * i) for i in range(pages)), pages),
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /FirstChar 32 /LastChar 255 /Widths [%s]'
+               b' /Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences [128 %s] >> >>' % (
+                   b' '.join([b'500'] * 224), differences)]
+    for i, content in enumerate(contents):
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >>'
+                       b' /Contents %d 0 R >>' % (5 + 2 * i))
+        objects.append(b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream')
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n' % (i + 1) + obj + b'\nendobj\n'
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    data += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return amounts
+
+
+def old_parse_pdf(path):
+    """Previous parse_pdf: table of the first page only"""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return pdf.pages[0].extract_table()
+
+
+def whole_pages(path):
+    """All pages without cropping to line items"""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [row for page in pdf.pages for table in page.extract_tables() for row in table]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    items = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'invoice.pdf')
+        amounts = write_invoice(path, pages, items)
+        cache = InvoiceCache(os.path.join(folder, 'cache'))
+        old, old_time = timed(lambda: old_parse_pdf(path))
+        whole, whole_time = timed(lambda: whole_pages(path))
+        serial, serial_time = timed(lambda: extract_invoice_rows(path, max_workers=1, cache=False))
+        parallel, parallel_time = timed(lambda: extract_invoice_rows(path, cache=cache))
+        cached, cached_time = timed(lambda: extract_invoice_rows(path, cache=cache))
+        assert serial == parallel == cached
+        found = sum(1 for row in serial if row[0] in ITEMS)
+        print(f'{pages} pages, {len(amounts)} line items, {os.cpu_count()} CPUs')
+        print(f'first page, whole page:  {old_time:6.2f} s, {sum(1 for row in old if row[0] in ITEMS)} items')
+        print(f'all pages, whole pages:  {whole_time:6.2f} s, {sum(1 for row in whole if row[0] in ITEMS)} items')
+        print(f'all pages, cropped:      {serial_time:6.2f} s, {found} items')
+        print(f'all pages, processes:    {parallel_time:6.2f} s')
+        print(f'cached:                  {cached_time:6.3f} s')
+        assert [tuple(row) for row in serial if row[0] in ITEMS] == amounts
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Import time of main.py must not depend on CRM latency
+
+Run: python benchmarks/bench_startup.py
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_server import start_server, make_config_dir
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = '''
+import time
+t = time.perf_counter()
+import main
+t_import = time.perf_counter() - t
+t = time.perf_counter()
+main.REFERENCE.divisions
+main.REFERENCE.phones
+t_first = time.perf_counter() - t
+from report import calc_phones_cost_to_division, calculate_expenses_by_divisions
+t = time.perf_counter()
+calculate_expenses_by_divisions(10000, 900, 4500)
+calc_phones_cost_to_division(cost_per_number=160)
+t_second = time.perf_counter() - t
+print(f"{t_import:.3f} {t_first:.3f} {t_second:.3f}")
+'''
+
+
+def run(latency):
+    server = start_server(latency=latency)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            make_config_dir(tmp, f'http://127.0.0.1:{server.server_port}')
+            env = dict(os.environ, PYTHONPATH=REPO, QT_QPA_PLATFORM='offscreen')
+            out = subprocess.run([sys.executable, '-c', SNIPPET], cwd=tmp, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            return [float(x) for x in out.split()[-3:]]
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    print(f'{"latency, s":>10} {"import, s":>10} {"first use, s":>13} {"reuse, s":>9}')
+    for latency in (0.0, 0.5, 1.0):
+        t_import, t_first, t_second = run(latency)
+        print(f'{latency:>10.1f} {t_import:>10.3f} {t_first:>13.3f} {t_second:>9.3f}')
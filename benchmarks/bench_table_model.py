@@ -0,0 +1,106 @@
+"""Paint and scroll of QTableView at 1M rows: iloc-based model against the column array model
+
+Run: QT_QPA_PLATFORM=offscreen python benchmarks/bench_table_model.py [rows]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+from PySide6.QtWidgets import QApplication, QTableView
+
+from table_model import PandasModel
+
+SCROLLS = 200
+
+
+class IlocModel(QAbstractTableModel):
+    """Previous PandasModel"""
+
+    def __init__(self, dataframe, parent=None):
+        QAbstractTableModel.__init__(self, parent)
+        self._dataframe = dataframe
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self._dataframe) if parent == QModelIndex() else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self._dataframe.columns) if parent == QModelIndex() else 0
+
+    def data(self, index, role=Qt.ItemDataRole):
+        if index.isValid() and role == Qt.DisplayRole:
+            return str(self._dataframe.iloc[index.row(), index.column()])
+        return None
+
+    def headerData(self, section, orientation, role):
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return str(self._dataframe.columns[section])
+            return str(self._dataframe.index[section])
+        return None
+
+
+def synthetic_report(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'Номер': rng.integers(78312000000, 78312999999, n).astype(str),
+                         'Дата': pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 31 * 86400, n), 's'),
+                         'Длительность': rng.integers(1, 900, n),
+                         'Звонки': rng.random(n) * 100,
+                         'Номера': rng.random(n) * 10})
+
+
+def bench(model, app):
+    view = QTableView()
+    view.resize(1000, 700)
+    view.show()
+    started = time.perf_counter()
+    view.setModel(model)
+    view.repaint()
+    app.processEvents()
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    while model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+    fetch_all = time.perf_counter() - started
+    bar = view.verticalScrollBar()
+    rng = np.random.default_rng(1)
+    started = time.perf_counter()
+    for _ in range(SCROLLS):
+        bar.setValue(int(rng.integers(0, bar.maximum() + 1)))
+        view.viewport().repaint()
+    app.processEvents()
+    scroll = (time.perf_counter() - started) / SCROLLS
+    view.close()
+    return first, fetch_all, scroll
+
+
+def data_only(model, rows=40):
+    """Time of data() calls for one screen of cells, without Qt painting"""
+    rng = np.random.default_rng(2)
+    columns = model.columnCount()
+    started = time.perf_counter()
+    for _ in range(SCROLLS):
+        top = int(rng.integers(0, model.rowCount() - rows))
+        for row in range(top, top + rows):
+            for column in range(columns):
+                model.data(model.index(row, column), Qt.DisplayRole)
+    return (time.perf_counter() - started) / SCROLLS
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    app = QApplication(sys.argv)
+    df = synthetic_report(n)
+    print(f'{n} rows')
+    for name, model_class in (('iloc', IlocModel), ('column arrays', PandasModel)):
+        started = time.perf_counter()
+        model = model_class(df)
+        build = time.perf_counter() - started
+        first, fetch_all, scroll = bench(model, app)
+        screen = data_only(model)
+        print(f'{name:>14}: build {build * 1000:6.1f} ms, first paint {first * 1000:6.1f} ms, '
+              f'all batches {fetch_all * 1000:7.1f} ms, scroll+paint {scroll * 1000:6.2f} ms, '
+              f'data() per screen {screen * 1000:6.2f} ms')
@@ -0,0 +1,47 @@
+"""Header sort and filters of PandasModel on a 1M-row call table
+
+Run: QT_QPA_PLATFORM=offscreen python benchmarks/bench_table_sort.py [rows]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QTableView
+
+from bench_table_model import synthetic_report
+from table_model import PandasModel
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10 ** 6
+    app = QApplication(sys.argv)
+    df = synthetic_report(n)
+    model = PandasModel(df)
+    view = QTableView()
+    view.resize(1000, 700)
+    view.setModel(model)
+    view.setSortingEnabled(True)
+    view.show()
+    app.processEvents()
+    print(f'{n} rows')
+    for column in range(model.columnCount()):
+        name = model.headerData(column, Qt.Horizontal, Qt.DisplayRole)
+        first = timed(lambda: (view.sortByColumn(column, Qt.AscendingOrder), view.viewport().repaint()))
+        again = timed(lambda: (view.sortByColumn(column, Qt.DescendingOrder), view.viewport().repaint()))
+        print(f'  sort {name:>14}: first {first:7.1f} ms, cached {again:6.1f} ms')
+    for name, mask in (('number contains', lambda: model.mask_contains('Номер', '7831255')),
+                       ('cost at least', lambda: model.mask_at_least('Звонки', 90.0))):
+        rows = []
+        elapsed = timed(lambda: (model.set_filter(mask()), rows.append(model.rowCount()),
+                                 view.viewport().repaint()))
+        print(f'  filter {name:>16}: {elapsed:7.1f} ms')
+    model.set_filter(None)
@@ -0,0 +1,50 @@
+"""Whole period in one request against concurrent day windows
+
+Run: python benchmarks/bench_windowed_fetch.py
+"""
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stub_server import start_server, make_history
+
+from api_client import CrmClient, HISTORY
+from history import fetch_windows, merge_calls, period_bounds
+
+CALLS = 60000
+LATENCY = 0.2
+LATENCY_PER_CALL = 0.00005
+
+
+def run(client, start, end, window_days, workers):
+    started = time.perf_counter()
+    if window_days:
+        df = merge_calls(fetch_windows(start, end, datetime.timedelta(days=window_days), workers, client,
+                                       params={'type': 'out'}))
+    else:
+        params = {'type': 'out',
+                  'start': start.strftime('%Y%m%dT%H%M%SZ'),
+                  'end': end.strftime('%Y%m%dT%H%M%SZ')}
+        df = merge_calls([client.get(HISTORY, params).json()])
+    return time.perf_counter() - started, len(df)
+
+
+if __name__ == '__main__':
+    start, end = period_bounds('last_month')
+    days = (end - start).days + 1
+    history = make_history(CALLS, start, days, ['78312148909', '78312150073', '78312150093'])
+    for max_concurrent in (0, 4):
+        server = start_server(latency=LATENCY, history=history, latency_per_call=LATENCY_PER_CALL,
+                              max_concurrent=max_concurrent)
+        client = CrmClient(backoff=0.05)
+        client._config = {'token': 'test', 'path_to_api': f'http://127.0.0.1:{server.server_port}'}
+        print(f'{CALLS} calls, {days} days, server limit {max_concurrent or "none"}')
+        for window_days, workers in ((0, 1), (7, 4), (1, 8), (1, 16)):
+            elapsed, rows = run(client, start, end, window_days, workers)
+            mode = f'{window_days}d x {workers}' if window_days else 'single'
+            print(f'  {mode:>10}: {elapsed:6.2f} s, {rows} rows, {CALLS / elapsed:9.0f} calls/s')
+        print(f'  requests: {client.stats["requests"]}')
+        server.shutdown()
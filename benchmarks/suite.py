@@ -0,0 +1,386 @@
+"""Benchmark suite of the report pipeline: throughput and peak RSS of every stage at every size
+
+Every stage runs in a fresh process. Its input is generated first from
+synthetic.py and is not counted, then peak RSS is reset and the stage is timed.
+Generated payloads are kept in --data between runs. Results are saved as JSON
+together with versions and commit, --compare prints ratios against an earlier run.
+
+Peak RSS of every stage is checked against limits of thresholds.json: an absolute
+limit growing with size and, with --compare, allowed growth against the earlier
+run. The suite exits with 1 when a stage is over a limit. --tracemalloc adds
+tracemalloc peak and the biggest allocation sites, stages run slower with it.
+
+Run: python benchmarks/suite.py [--sizes 10k,100k,1m] [--stages json_parse,to_excel] [-o results.json]
+                                [--compare benchmarks/results/previous.json] [--thresholds thresholds.json]
+                                [--tracemalloc]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.dirname(BENCHMARKS)
+sys.path.insert(0, BENCHMARKS)
+sys.path.insert(0, REPO)
+
+# Номеров в подразделении и звонков на подразделение в синтетических данных
+NUMBERS_PER_DIVISION = 5
+CALLS_PER_DIVISION = 1000
+MAX_DIVISIONS = 2000
+
+
+def status_mib(field):
+    """VmRSS or VmHWM (peak RSS) of this process, None where /proc is not available"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def reset_peak():
+    """Start VmHWM from current RSS, so peaks of data generation are not counted"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_mib():
+    peak = status_mib('VmHWM')
+    if peak is None:
+        # Без /proc пик считается с запуска процесса, вместе с подготовкой данных
+        if sys.platform == 'win32':
+            from memory_profile import peak_rss_bytes
+            return (peak_rss_bytes() or 0) / 2 ** 20
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return peak
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000"""
+    text = text.strip().lower()
+    scale = {'k': 10 ** 3, 'm': 10 ** 6}.get(text[-1:], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def size_label(n):
+    for suffix, scale in (('m', 10 ** 6), ('k', 10 ** 3)):
+        if n >= scale and n % scale == 0:
+            return f'{n // scale}{suffix}'
+    return str(n)
+
+
+def reference_for(n):
+    from synthetic import make_reference
+    return make_reference(min(max(n // CALLS_PER_DIVISION, 1), MAX_DIVISIONS), NUMBERS_PER_DIVISION)
+
+
+def calls_for(n, reference):
+    from synthetic import make_calls
+    return make_calls(n, reference.phones['number'].tolist())
+
+
+def history_file(n, data):
+    from synthetic import write_history
+    numbers = reference_for(n).phones['number'].tolist()
+    return write_history(os.path.join(data, f'history_{size_label(n)}.json'), n, numbers)
+
+
+def file_chunks(path):
+    from history import CHUNK_SIZE
+    with open(path, 'rb') as f:
+        yield from iter(lambda: f.read(CHUNK_SIZE), b'')
+
+
+# Стадия готовит данные и импортирует модули, затем возвращает (функция без аргументов, число элементов).
+# Замеряется только вызов функции.
+def stage_json_parse(n, data):
+    from history import read_calls
+    path = history_file(n, data)
+    return lambda: read_calls(file_chunks(path)), n
+
+
+def stage_json_normalize(n, data):
+    import pandas as pd
+    path = history_file(n, data)
+
+    def run():
+        with open(path, 'rb') as f:
+            df = pd.json_normalize(json.load(f))
+        return df.query('status == "success"')
+
+    return run, n
+
+
+def stage_expenses_by_divisions(n, data):
+    from report import calculate_expenses_by_divisions
+    divisions = reference_for(n).divisions
+    return lambda: calculate_expenses_by_divisions(10600, 900, 4500, divisions=divisions.copy()), len(divisions)
+
+
+def stage_expenses_by_numbers2(n, data):
+    from report import calculate_expenses_by_numbers2
+    reference = reference_for(n)
+    calls = calls_for(n, reference)
+    return lambda: calculate_expenses_by_numbers2(calls, 160, 23000, phones=reference.phones), n
+
+
+def stage_build_report(n, data):
+    from report import build_report
+    reference = reference_for(n)
+    calls = calls_for(n, reference)
+    return lambda: build_report(calls, 10600, 900, 4500, 160, 23000, reference=reference), n
+
+
+def stage_model_paint(n, data):
+    """Model build, first paint and 100 jumps of the scroll bar"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication, QTableView
+    from table_model import PandasModel
+    app = QApplication.instance() or QApplication([])
+    calls = calls_for(n, reference_for(n))
+
+    def run():
+        view = QTableView()
+        view.resize(1000, 700)
+        view.show()
+        view.setModel(PandasModel(calls))
+        view.repaint()
+        app.processEvents()
+        bar = view.verticalScrollBar()
+        for i in range(100):
+            bar.setValue(bar.maximum() * i // 99)
+            view.viewport().repaint()
+        app.processEvents()
+        view.close()
+
+    return run, n
+
+
+def prepare_report(n):
+    from report import build_report
+    reference = reference_for(n)
+    calls = calls_for(n, reference)
+    return reference, calls, build_report(calls, 10600, 900, 4500, 160, 23000, reference=reference)
+
+
+def stage_to_excel(n, data):
+    import pandas as pd
+    reference, calls, report = prepare_report(n)
+
+    def run():
+        with pd.ExcelWriter(os.path.join(data, 'to_excel.xlsx')) as excel:
+            report.to_excel(excel, sheet_name='Итого', index=False)
+            calls.assign(start=calls['start'].dt.tz_convert(None)).to_excel(excel, sheet_name='Звонки', index=False)
+
+    return run, n
+
+
+def stage_export_xlsx(n, data):
+    import openpyxl  # noqa: F401, импорт не входит в замер
+    from export import export_report
+    reference, calls, report = prepare_report(n)
+    return lambda: export_report(os.path.join(data, 'export.xlsx'), report, calls, reference), n
+
+
+def stage_excel_statistic(n, data):
+    from excel_statistic import read_raw_statistic
+    from synthetic import phone_numbers, write_export
+    path = os.path.join(data, f'statistic_{size_label(n)}.xlsx')
+    if not os.path.exists(path):
+        write_export(path, 1, n, phone_numbers(50), seed=n)
+    return lambda: read_raw_statistic(path), n
+
+
+def stage_invoice_classify(n, data):
+    from reference import REFERENCE
+    from synthetic import invoice_rows
+    classifier = REFERENCE.invoice_classifier
+    rows = invoice_rows(n)
+    return lambda: classifier.classify(rows), len(rows)
+
+
+# name: (stage, unit of throughput, largest size or None)
+STAGES = {
+    'json_parse': (stage_json_parse, 'calls', None),
+    'json_normalize': (stage_json_normalize, 'calls', 5 * 10 ** 6),
+    'expenses_by_divisions': (stage_expenses_by_divisions, 'divisions', None),
+    'expenses_by_numbers2': (stage_expenses_by_numbers2, 'calls', None),
+    'build_report': (stage_build_report, 'calls', None),
+    'model_paint': (stage_model_paint, 'rows', None),
+    'to_excel': (stage_to_excel, 'calls', 10 ** 6),
+    'export_xlsx': (stage_export_xlsx, 'calls', 5 * 10 ** 6),
+    'excel_statistic': (stage_excel_statistic, 'calls', 10 ** 6),
+    'invoice_classify': (stage_invoice_classify, 'lines', 10 ** 7),
+}
+
+
+def run_stage(name, n, data, trace_malloc=False):
+    """Run one stage in this process and return its measurements"""
+    from memory_profile import MemoryProfiler
+    stage, unit, _ = STAGES[name]
+    run, items = stage(n, data)
+    profiler = MemoryProfiler(enabled=trace_malloc, top=5)
+    reset_peak()
+    before = status_mib('VmRSS')
+    started = time.perf_counter()
+    with profiler.stage(name):
+        # Результат живет до конца замера, места выделения показывают, из чего он состоит
+        output = run()
+    seconds = time.perf_counter() - started
+    peak = peak_mib()
+    del output
+    result = {'stage': name, 'size': n, 'seconds': round(seconds, 4), 'items': items, 'unit': unit,
+              'per_second': round(items / seconds, 1) if seconds else None,
+              'peak_rss_mib': round(peak - (before or 0), 1)}
+    if trace_malloc:
+        record = profiler.stages[0]
+        result.update(tracemalloc_peak_mib=round(record['peak_bytes'] / 2 ** 20, 1), sites=record['sites'])
+    return result
+
+
+def limit_mib(limits, metric, n):
+    """Absolute limit of metric for size n: base_mib + mib_per_m * millions of items"""
+    limit = limits.get(metric)
+    if limit is None:
+        return None
+    return limit.get('base_mib', 0) + limit.get('mib_per_m', 0) * n / 10 ** 6
+
+
+def check_thresholds(results, thresholds, previous=None):
+    """
+    :param thresholds: dict loaded from thresholds.json
+    :param previous: results of an earlier run by (stage, size), growth against them is checked
+    :return: list of messages about stages over limits
+    """
+    growth, slack = thresholds.get('growth'), thresholds.get('slack_mib', 0)
+    problems = []
+    for result in results:
+        name, n = result['stage'], result['size']
+        limits = thresholds.get('stages', {}).get(name, {})
+        for metric in ('peak_rss_mib', 'tracemalloc_peak_mib'):
+            value = result.get(metric)
+            if value is None:
+                continue
+            limit = limit_mib(limits, metric, n)
+            if limit is not None and value > limit:
+                problems.append(f'{name} {size_label(n)}: {metric} {value:.1f} MiB is over limit {limit:.1f} MiB')
+            before = (previous or {}).get((name, n), {}).get(metric)
+            if growth is not None and before is not None and value > before * (1 + growth) + slack:
+                problems.append(f'{name} {size_label(n)}: {metric} {value:.1f} MiB grew from {before:.1f} MiB')
+    return problems
+
+
+def metadata():
+    import numpy
+    import pandas
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO, capture_output=True,
+                                text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': commit,
+            'python': platform.python_version(), 'pandas': pandas.__version__, 'numpy': numpy.__version__,
+            'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+
+def print_result(result, previous=None):
+    line = (f'{result["stage"]:>22} {size_label(result["size"]):>6}: {result["seconds"]:9.3f} s '
+            f'{result["per_second"] or 0:14,.0f} {result["unit"]}/s  peak RSS +{result["peak_rss_mib"]:8.1f} MiB')
+    if 'tracemalloc_peak_mib' in result:
+        line += f'  tracemalloc {result["tracemalloc_peak_mib"]:8.1f} MiB'
+    if previous is not None:
+        line += (f'  time x{result["seconds"] / previous["seconds"]:.2f}'
+                 f'  RSS {result["peak_rss_mib"] - previous["peak_rss_mib"]:+.1f} MiB')
+    print(line, flush=True)
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return {(r['stage'], r['size']): r for r in json.load(f)['results']}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark suite of the report pipeline')
+    parser.add_argument('--sizes', default='10k,100k,1m', help='numbers of calls: 10k,100k,1m,50m')
+    parser.add_argument('--stages', default=','.join(STAGES), help='stages: ' + ', '.join(STAGES))
+    parser.add_argument('--data', help='folder for generated inputs, temporary by default')
+    parser.add_argument('-o', '--output', help='JSON file of results, benchmarks/results/<date>-<commit>.json by default')
+    parser.add_argument('--compare', help='JSON file of an earlier run')
+    parser.add_argument('--thresholds', default=os.path.join(BENCHMARKS, 'thresholds.json'),
+                        help='JSON file of memory limits, benchmarks/thresholds.json by default')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='measure tracemalloc peak and allocation sites, stages run slower')
+    parser.add_argument('--run', nargs=3, metavar=('STAGE', 'SIZE', 'DATA'), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run:
+        stage, size, data = args.run
+        print(json.dumps(run_stage(stage, int(size), data, args.tracemalloc)))
+        return 0
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    stages = args.stages.split(',')
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        print(f'Unknown stages: {", ".join(sorted(unknown))}', file=sys.stderr)
+        return 2
+    previous = load_results(args.compare) if args.compare else {}
+    meta = metadata()
+    results = []
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data = args.data or tmp
+        os.makedirs(data, exist_ok=True)
+        for n in sizes:
+            for stage in stages:
+                largest = STAGES[stage][2]
+                if largest is not None and n > largest:
+                    print(f'{stage:>22} {size_label(n):>6}: skipped, larger than {size_label(largest)}')
+                    continue
+                command = [sys.executable, __file__, '--run', stage, str(n), data]
+                if args.tracemalloc:
+                    command.append('--tracemalloc')
+                done = subprocess.run(command, capture_output=True, text=True)
+                if done.returncode:
+                    print(f'{stage:>22} {size_label(n):>6}: failed\n{done.stderr[-2000:]}', file=sys.stderr)
+                    failed.append(f'{stage} {size_label(n)}')
+                    continue
+                result = json.loads(done.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print_result(result, previous.get((stage, n)))
+                for site, size in result.get('sites', []):
+                    print(f'{"":>31}{size / 1024:12,.0f} KiB  {site}')
+    output = args.output or os.path.join(BENCHMARKS, 'results', f'{meta["date"][:10]}-{meta["commit"] or "local"}.json')
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=1)
+    print(f'Results saved to {output}')
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds, 'r', encoding='utf-8') as f:
+            problems = check_thresholds(results, json.load(f), previous)
+        for problem in problems:
+            print(f'Memory regression: {problem}', file=sys.stderr)
+        if problems:
+            return 1
+    if failed:
+        print(f'Failed stages: {", ".join(failed)}', file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
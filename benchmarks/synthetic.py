@@ -0,0 +1,133 @@
+"""Deterministic synthetic data for benchmarks: CRM history payloads, typed calls, DomRu Excel exports, invoice tables
+
+The same size and seed always give the same data, so runs on different
+machines and versions are comparable. Payloads are generated by chunks and
+never held in memory whole, sizes up to 50M calls are written straight to disk.
+"""
+import datetime
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import numpy as np
+import pandas as pd
+
+CALL_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+START = datetime.datetime(2024, 1, 1)
+TYPES = ['Входящие телефонные звонки', 'Исходящие местные телефонные звонки', 'Исходящие телефонные звонки']
+INVOICE_ITEMS = ['Дополнительная группа пользователей', 'Дополнительные внутренние номера',
+                 'Безлимитная запись разговоров', 'ОАТС Про', 'Интеграция с CRM', 'Алгоритм распределения вызовов',
+                 'Минуты местной связи', 'Соединения по сети передачи данных', 'Аренда оборудования']
+
+
+def phone_numbers(count):
+    return [f'7831{i:07d}' for i in range(count)]
+
+
+def make_reference(divisions, numbers_per_division=5):
+    """
+    ReferenceData with synthetic phones and divisions, CRM is not asked for employees
+    """
+    from reference import ReferenceData
+    phones = pd.DataFrame({'number': phone_numbers(divisions * numbers_per_division),
+                           'division_id': np.repeat(np.arange(1, divisions + 1), numbers_per_division),
+                           'description': 'Основной отдела'})
+    divisions = pd.DataFrame({'id': np.arange(1, divisions + 1),
+                              'name': [f'Аптека {i}/1' for i in range(1, divisions + 1)],
+                              'employees': 3,
+                              'departments': 1})
+    reference = ReferenceData()
+    reference.preload(phones, divisions)
+    return reference
+
+
+def history_chunks(n, numbers, days=31, seed=0, chunk=100000):
+    """
+    Body of /crmapi/v1/history/json with n calls
+    :return: iterator of bytes, together they are one JSON array
+    """
+    rng = np.random.default_rng(seed)
+    numbers = np.array(numbers, dtype=object)
+    yield b'['
+    for first in range(0, n, chunk):
+        size = min(chunk, n - first)
+        moments = (np.datetime64(START, 's') + rng.integers(0, days * 86400, size)).astype(datetime.datetime)
+        status = np.where(rng.random(size) < 0.8, 'success', 'missed')
+        diversion = numbers[rng.integers(0, len(numbers), size)]
+        client = rng.integers(10 ** 9, 10 ** 10, size)
+        wait = rng.integers(0, 30, size)
+        duration = rng.integers(1, 900, size)
+        moments, status, diversion = moments.tolist(), status.tolist(), diversion.tolist()
+        client, wait, duration = client.tolist(), wait.tolist(), duration.tolist()
+        # Все значения без кавычек и обратных слешей, json.dumps для каждого звонка не нужен
+        calls = (f'{{"uid": "{first + i:012d}", "type": "out", "status": "{status[i]}", "client": "7{client[i]}", '
+                 f'"diversion": "{diversion[i]}", "start": "{moments[i]:{CALL_DATE_FORMAT}}", "wait": {wait[i]}, '
+                 f'"duration": {duration[i]}}}' for i in range(size))
+        yield (',' if first else '').encode() + ','.join(calls).encode()
+    yield b']'
+
+
+def write_history(path, n, numbers, days=31, seed=0):
+    """Write history payload to file unless it is already there, return path"""
+    if not os.path.exists(path):
+        with open(path + '.tmp', 'wb') as f:
+            for data in history_chunks(n, numbers, days, seed):
+                f.write(data)
+        os.replace(path + '.tmp', path)
+    return path
+
+
+def make_calls(n, numbers=None, seed=0):
+    """Typed call history in CALL_SCHEMA without going through JSON"""
+    if numbers is None:
+        from reference import REFERENCE
+        numbers = REFERENCE.phones['number'].tolist()
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(START, tz='UTC') + pd.to_timedelta(rng.integers(0, 31 * 86400, n), unit='s')
+    return pd.DataFrame({'uid': pd.array([f'{i:012d}' for i in range(n)], dtype='string'),
+                         'start': start,
+                         'diversion': pd.Categorical.from_codes(rng.integers(0, len(numbers), n), numbers),
+                         'duration': rng.integers(1, 900, n).astype('int32')})
+
+
+def write_export(path, month, calls, numbers, seed):
+    """Excel export of one month in the layout of DomRu statistics: 9 title rows, then the table"""
+    from openpyxl import Workbook
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    for i in range(9):
+        ws.append([f'Статистика звонков, строка {i}'])
+    ws.append(['Дата', 'Тип звонка', 'Через', 'Длительность', 'Клиент', 'Регион'])
+    start = datetime.datetime(2024, month, 1)
+    offsets = rng.integers(0, 28 * 86400, calls).tolist()
+    types = rng.integers(0, len(TYPES), calls).tolist()
+    via = rng.integers(0, len(numbers), calls).tolist()
+    seconds = rng.integers(0, 3600, calls).tolist()
+    clients = rng.integers(10 ** 9, 10 ** 10, calls).tolist()
+    for i in range(calls):
+        s = seconds[i]
+        ws.append([start + datetime.timedelta(seconds=offsets[i]),
+                   TYPES[types[i]],
+                   numbers[via[i]],
+                   f'{s // 3600}:{s // 60 % 60:02d}:{s % 60:02d}',
+                   f'7{clients[i]}',
+                   'Нижегородская обл.'])
+    wb.save(path)
+
+
+def invoice_rows(n, seed=0):
+    """
+    Rows of invoice tables as invoice_pdf.extract_invoice_rows returns them: header, items, totals
+    and broken rows at page breaks
+    """
+    rng = np.random.default_rng(seed)
+    rows = [['Наименование услуги', 'Сумма', 'НДС']]
+    names = rng.integers(0, len(INVOICE_ITEMS), n).tolist()
+    amounts = (rng.integers(100, 500000, n) / 100).tolist()
+    for i in range(n):
+        rows.append([INVOICE_ITEMS[names[i]], f'{amounts[i]:,.2f}'.replace(',', ' ').replace('.', ','), '20%'])
+        if i % 30 == 29:
+            rows.append([None, None, None])
+    rows.append(['Итого', f'{sum(amounts):.2f}'.replace('.', ','), ''])
+    return rows
@@ -0,0 +1,153 @@
+import datetime
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+
+import pandas as pd
+
+from api_client import get_client
+from history import (API_DATE_FORMAT, CALL_COLUMNS, CALL_START, fetch_window_list, merge_calls, parse_api_date,
+                     period_bounds)
+from reference import CACHE_DIR
+from tracing import traced
+
+SCHEMA_VERSION = 2
+# CRM дописывает звонки с опозданием: день закрывается, только если запрошен позже этого после его конца
+CLOSE_AFTER = datetime.timedelta(hours=6)
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS calls (
+    uid TEXT,
+    day TEXT NOT NULL,
+    start TEXT,
+    status TEXT,
+    diversion TEXT,
+    duration INTEGER
+);
+CREATE INDEX IF NOT EXISTS calls_uid ON calls (uid);
+CREATE INDEX IF NOT EXISTS calls_day ON calls (day);
+CREATE TABLE IF NOT EXISTS days (
+    day TEXT PRIMARY KEY,
+    closed INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL
+);
+'''
+
+
+def store_path(base_url, folder=None):
+    """Store file of one CRM API, calls of a test server never mix with calls of the real one"""
+    key = hashlib.sha256(base_url.rstrip('/').encode()).hexdigest()[:12]
+    return os.path.join(folder or CACHE_DIR, f'calls_{key}.sqlite')
+
+
+class CallStore:
+    """Local SQLite store of call history
+
+    Calls are kept by day of the request window they were fetched with.
+    A day is closed when it was fetched CLOSE_AFTER past the UTC end of its
+    request window: it is not requested from CRM again until invalidated.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: SQLite file, see store_path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as con:
+            if con.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                con.executescript('DROP TABLE IF EXISTS calls; DROP TABLE IF EXISTS days;')
+                con.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        # Соединение sqlite3 как контекст только фиксирует транзакцию, закрываем его сами
+        with closing(sqlite3.connect(self.path)) as con, con:
+            yield con
+
+    def missing_days(self, days):
+        """
+        :param days: list of dates
+        :return: dates which are not stored or still open
+        """
+        with self._connect() as con:
+            closed = {row[0] for row in con.execute('SELECT day FROM days WHERE closed = 1')}
+        return [day for day in days if day.isoformat() not in closed]
+
+    @traced('store put')
+    def put(self, day, calls, closed):
+        """
+        Replace calls of the day
+        :param day: date
+        :param calls: dataframe returned by read_calls
+        :param closed: day is over and will not change
+        """
+        key = day.isoformat()
+        rows = ((uid, key, start, status, diversion, int(duration))
+                for uid, start, status, diversion, duration in calls[CALL_COLUMNS].itertuples(index=False))
+        with self._lock, self._connect() as con:
+            con.execute('DELETE FROM calls WHERE day = ?', (key,))
+            con.executemany('INSERT INTO calls (uid, day, start, status, diversion, duration) '
+                            'VALUES (?, ?, ?, ?, ?, ?)', rows)
+            con.execute('INSERT OR REPLACE INTO days (day, closed, fetched_at) VALUES (?, ?, ?)',
+                        (key, int(closed), datetime.datetime.now().isoformat()))
+
+    def invalidate(self, first, last):
+        """Open days between dates inclusive, they are requested from CRM again"""
+        with self._lock, self._connect() as con:
+            con.execute('UPDATE days SET closed = 0 WHERE day BETWEEN ? AND ?', (first.isoformat(), last.isoformat()))
+
+    @traced('store load')
+    def load(self, first, last):
+        """
+        :param first: first date
+        :param last: last date
+        :return: dataframe of stored calls between dates inclusive
+        """
+        with self._connect() as con:
+            return pd.read_sql_query(f'SELECT {", ".join(CALL_COLUMNS)} FROM calls WHERE day BETWEEN ? AND ? '
+                                     f'ORDER BY day, {CALL_START}', con,
+                                     params=(first.isoformat(), last.isoformat()))
+
+
+def days_between(first, last):
+    return [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def day_closed(day, now=None):
+    """
+    :param day: date of request window, its bounds are sent to CRM as UTC
+    :param now: naive UTC datetime of fetch, current time by default
+    :return: True when the day ended at least CLOSE_AFTER before now
+    """
+    now = now or datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return now >= datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min) + CLOSE_AFTER
+
+
+def request_history_cached(start_date_='', end_date='', period='last_month', max_workers=8, store=None,
+                           client=None, progress=None, cancelled=None, numbers=None, refresh=False):
+    """
+    Same as request_history, but only days missing in the local store and open days are requested from CRM
+    :param refresh: request every day of the period again, even closed ones
+    """
+    if period != '':
+        start, end = period_bounds(period)
+    else:
+        start, end = parse_api_date(start_date_), parse_api_date(end_date)
+    client = client or get_client()
+    store = store or CallStore(store_path(client.config.get('path_to_api', '')))
+    if refresh:
+        store.invalidate(start.date(), end.date())
+    missing = store.missing_days(days_between(start.date(), end.date()))
+    windows = [(datetime.datetime.combine(day, datetime.time.min).strftime(API_DATE_FORMAT),
+                datetime.datetime.combine(day, datetime.time(23, 59, 59)).strftime(API_DATE_FORMAT))
+               for day in missing]
+    if windows:
+        chunks = fetch_window_list(windows, max_workers, client, {'type': 'out'}, progress, cancelled)
+        fetched = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        for day, calls in zip(missing, chunks):
+            store.put(day, calls, closed=day_closed(day, fetched))
+    return merge_calls([store.load(start.date(), end.date())], numbers)
@@ -0,0 +1,217 @@
+"""Headless report generator, Qt is never imported
+
+Examples:
+    python cli.py --period last_month -o report.xlsx
+    python cli.py --start 2024-01-01 --end 2024-01-31 --invoice invoice.pdf -o report.csv
+    python cli.py --months 2024-01:2024-12 -o reports_2024
+    python cli.py --accounts -o group.xlsx
+    python cli.py --import-invoices invoices --months 2024-01:2024-12 --stored-costs -o reports_2024
+    python cli.py --period last_month -o report.xlsx --trace trace.json
+    python cli.py --period last_month -o report.xlsx --memory memory.json
+    python cli.py --period last_month -o report.xlsx --transport replay
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+from accounts import COST_NAMES, account_reports, load_accounts, write_consolidated
+from api_client import CrmApiError
+from batch import generate_reports, parse_months
+from export import FORMATS, export_divisions, export_report, write_report
+from history import API_DATE_FORMAT, period_bounds
+from memory_profile import PROFILER
+from report import build_report, costs_from_invoice, request_history
+from tracing import TRACER
+from transport import MODES
+
+PERIODS = ['last_month', 'this_month', 'last_week', 'this_week', 'yesterday', 'today']
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Отчет о затратах на телефонию DomRu по подразделениям')
+    parser.add_argument('--period', choices=PERIODS, default='last_month', help='период CRM API')
+    parser.add_argument('--start', type=datetime.date.fromisoformat, help='первый день, YYYY-MM-DD')
+    parser.add_argument('--end', type=datetime.date.fromisoformat, help='последний день, YYYY-MM-DD')
+    parser.add_argument('--months', type=parse_months,
+                        help='отчеты за месяцы: 2024-01,2024-03 или 2024-01:2024-12, -o задает папку')
+    parser.add_argument('--accounts', action='store_true',
+                        help='сводный отчет по всем аккаунтам из списка accounts в cfg.json')
+    parser.add_argument('--division-files', metavar='FOLDER',
+                        help='дополнительно файл xlsx для каждого отдела: его строка отчета, номера и звонки')
+    parser.add_argument('--invoice', help='счет DomRu в PDF, суммы берутся из него')
+    parser.add_argument('--import-invoices', metavar='FOLDER',
+                        help='загрузить счета DomRu в PDF из папки в локальное хранилище, без -o только загрузка')
+    parser.add_argument('--stored-costs', action='store_true',
+                        help='суммы за месяц отчета берутся из загруженных счетов')
+    parser.add_argument('--subscription', type=float, default=4500, help='абонентская плата')
+    parser.add_argument('--personal', type=float, default=10600, help='затраты на сотрудников')
+    parser.add_argument('--departments', type=float, default=900, help='затраты на отделы')
+    parser.add_argument('--minutes', type=float, default=23000, help='затраты на минуты')
+    parser.add_argument('--number-cost', type=float, default=160, help='стоимость одного номера')
+    parser.add_argument('-o', '--output', help='файл отчета: .xlsx, .csv или .parquet')
+    parser.add_argument('--detail', action='store_true',
+                        help='добавить номера подразделений и все звонки: листы xlsx или файлы *_numbers, *_calls')
+    parser.add_argument('--workers', type=int, help='число процессов для --months, --import-invoices и --division-files')
+    parser.add_argument('--refresh', action='store_true',
+                        help='запросить из CRM заново дни периода, уже сохраненные в локальном хранилище звонков')
+    parser.add_argument('--transport', choices=MODES,
+                        help='record сохраняет ответы CRM в cache/responses, replay берет их оттуда без сети')
+    parser.add_argument('--trace', metavar='FILE',
+                        help='записать время этапов в FILE в формате Chrome trace (chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('--memory', metavar='FILE',
+                        help='записать память этапов запрос, расчет, сохранение и размеры данных в FILE (JSON), '
+                             'расчет идет в несколько раз медленнее')
+    args = parser.parse_args(argv)
+    if (args.start is None) != (args.end is None):
+        parser.error('--start and --end must be given together')
+    if args.months and args.accounts:
+        parser.error('--months and --accounts cannot be used together')
+    if args.output is None:
+        if not args.import_invoices:
+            parser.error('the following arguments are required: -o/--output')
+    elif not args.months and not args.output.lower().endswith(FORMATS):
+        parser.error('output must be .xlsx, .csv or .parquet')
+    return args
+
+
+def history_params(args):
+    if args.start is None:
+        return {'period': args.period, 'refresh': args.refresh}
+    start = datetime.datetime.combine(args.start, datetime.time.min)
+    end = datetime.datetime.combine(args.end, datetime.time(23, 59, 59))
+    return {'start_date_': start.strftime(API_DATE_FORMAT), 'end_date': end.strftime(API_DATE_FORMAT), 'period': '',
+            'refresh': args.refresh}
+
+
+def report_month(args):
+    """First day of month of the requested period"""
+    start = args.start or period_bounds(args.period)[0].date()
+    return start.replace(day=1)
+
+
+def month_costs(store, month, args):
+    """
+    Costs of month from invoice store, costs of arguments when month has no invoices
+    :return: tuple (personal, departments, subscription, number cost, minutes) as in build_report
+    """
+    costs = store.costs(month)
+    if costs is None:
+        print(f'No invoices for {month:%Y.%m}, costs of arguments are used', file=sys.stderr)
+        return args.personal, args.departments, args.subscription, args.number_cost, args.minutes
+    return costs['personal'], costs['divisions'], costs['subscription'], args.number_cost, costs['minutes']
+
+
+def import_invoices(folder, workers):
+    # pdfplumber нужен только для счетов, не загружаем его для обычного отчета
+    from invoice_store import import_invoice_folder
+    started = time.perf_counter()
+    result = import_invoice_folder(folder, max_workers=workers)
+    for file in result['no_month']:
+        print(f'Month of invoice {file} is not found', file=sys.stderr)
+    print(f'{len(result["imported"])} invoices imported, {result["skipped"]} already imported, '
+          f'{len(result["no_month"])} without month, {result["unmatched"]} unmatched lines '
+          f'in {time.perf_counter() - started:.1f} s', file=sys.stderr)
+
+
+def report_accounts(args):
+    accounts = load_accounts()
+    if not accounts:
+        print('cfg.json has no accounts', file=sys.stderr)
+        return 1
+
+    def on_result(account, result, seconds):
+        if isinstance(result, Exception):
+            print(f'{account.name}: failed after {seconds:.1f} s: {result}', file=sys.stderr)
+        else:
+            print(f'{account.name}: {result["Общая сумма"].sum():.2f} in {seconds:.1f} s', file=sys.stderr)
+
+    costs = dict(zip(COST_NAMES, (args.personal, args.departments, args.subscription, args.number_cost,
+                                  args.minutes)))
+    reports = account_reports(accounts, history_params(args), costs, on_result)
+    if not reports:
+        return 1
+    write_consolidated(reports, args.output)
+    print(f'Report saved to {args.output}', file=sys.stderr)
+    return 0 if len(reports) == len(accounts) else 1
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.transport:
+        # Через окружение режим получают все клиенты, в том числе аккаунтов и рабочих процессов
+        os.environ['DOMRU_TRANSPORT'] = args.transport
+    TRACER.enable(bool(args.trace))
+    if args.memory:
+        PROFILER.enable()
+    try:
+        return run(args)
+    except (CrmApiError, OSError) as e:
+        # Нет записанного ответа, CRM недоступен или файл не открывается: без трассировки стека
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        if args.trace:
+            print(f'Stages: {TRACER.summary_text()}', file=sys.stderr)
+            TRACER.write_chrome_trace(args.trace)
+        if args.memory:
+            print(PROFILER.report(), file=sys.stderr)
+            PROFILER.write_json(args.memory)
+
+
+def run(args):
+    if args.import_invoices:
+        import_invoices(args.import_invoices, args.workers)
+        if args.output is None:
+            return 0
+    store = None
+    if args.stored_costs:
+        from invoice_store import InvoiceStore
+        store = InvoiceStore()
+        if not args.months:
+            (args.personal, args.departments, args.subscription, args.number_cost,
+             args.minutes) = month_costs(store, report_month(args), args)
+    if args.invoice:
+        costs = costs_from_invoice(args.invoice)
+        args.personal = costs['personal']
+        args.departments = costs['divisions']
+        args.subscription = costs['subscription']
+        args.minutes = costs['minutes']
+        for row in costs['unmatched'].itertuples():
+            print(f'Invoice line is not classified: {row.name} {row.amount}', file=sys.stderr)
+    if args.months:
+        costs = (args.personal, args.departments, args.subscription, args.number_cost, args.minutes)
+        if store is not None:
+            costs = {month: month_costs(store, month, args) for month in args.months}
+        timings = generate_reports(args.months, costs, args.output, args.workers, args.refresh)
+        print(f'{len(args.months)} reports saved to {args.output}: fetch {timings["fetch"]:.1f} s, '
+              f'reports {timings["reports"]:.1f} s, total {timings["total"]:.1f} s', file=sys.stderr)
+        return 0
+    if args.accounts:
+        return report_accounts(args)
+    started = time.perf_counter()
+    with PROFILER.stage('request'):
+        call_history = request_history(**history_params(args))
+    PROFILER.record_size('call_history', call_history)
+    print(f'{len(call_history)} calls in {time.perf_counter() - started:.1f} s', file=sys.stderr)
+    with PROFILER.stage('calculate'):
+        report = build_report(call_history, args.personal, args.departments, args.subscription, args.number_cost,
+                              args.minutes)
+    PROFILER.record_size('to_model', report)
+    with PROFILER.stage('save'):
+        if args.detail:
+            export_report(args.output, report, call_history)
+        else:
+            write_report(report, args.output)
+    print(f'Report saved to {args.output}', file=sys.stderr)
+    if args.division_files:
+        started = time.perf_counter()
+        files = export_divisions(args.division_files, report, call_history, max_workers=args.workers)
+        print(f'{len(files)} division files saved to {args.division_files} in {time.perf_counter() - started:.1f} s',
+              file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
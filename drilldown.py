@@ -0,0 +1,25 @@
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QDialog, QTableView, QTabWidget, QVBoxLayout
+
+from table_model import PandasModel
+
+
+class DrillDownDialog(QDialog):
+    """Calls of one division: by numbers, by days and one by one"""
+
+    def __init__(self, name, numbers, days, calls, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(f'{name}: звонки')
+        self.resize(800, 600)
+        layout = QVBoxLayout(self)
+        tabs = QTabWidget(self)
+        layout.addWidget(tabs)
+        for title, df in (('По номерам', numbers), ('По дням', days), (f'Звонки ({len(calls)})', calls)):
+            view = QTableView(tabs)
+            view.setModel(PandasModel(df, view))
+            view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            view.setSortingEnabled(True)
+            view.setAlternatingRowColors(True)
+            view.horizontalHeader().setStretchLastSection(True)
+            view.resizeColumnsToContents()
+            tabs.addTab(view, title)
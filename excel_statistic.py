@@ -0,0 +1,109 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from statistic_cache import get_statistic_cache
+
+# Столбцы выгрузки статистики DomRu и их имена в датафрейме
+STATISTIC_COLUMNS = {'Дата': 'date',
+                     'Тип звонка': 'type',
+                     'Через': 'number',
+                     'duration': 'duration',
+                     'Клиент': 'caller'}
+
+
+def to_seconds(val):
+    val = str(val).split(':')
+    return int(val[0]) * 3600 + int(val[1]) * 60 + int(val[2])
+
+
+def durations_to_seconds(column):
+    """
+    Convert column of 'H:MM:SS' durations to seconds at once
+    :param column: series of durations as strings or datetime.time
+    :return: series of int seconds
+    """
+    return pd.to_timedelta(column.astype(str)).dt.total_seconds().astype('int64')
+
+
+def read_raw_statistic(path):
+    """
+    Read one Excel file of statistics with duration in seconds, all source columns are kept
+    """
+    df = pd.read_excel(path, skiprows=[0, 1, 2, 3, 4, 5, 6, 7, 8], dtype={'Через': 'str'})
+    df['duration'] = durations_to_seconds(df['Длительность'])
+    return df
+
+
+def project_statistic(df):
+    # Make new dataset with necessary columns
+    db = df[list(STATISTIC_COLUMNS)]
+    # Rename columns
+    db.columns = list(STATISTIC_COLUMNS.values())
+    return db
+
+
+def read_tel_excel_statistic(path, cache=None):
+    """ Read raw data from Excel file
+        :return Pandas dataset with columns:
+            date: Date and time of the call
+            type: type of the traffic such as:
+                Входящие телефонные звонки
+                Исходящие местные телефонные звонки
+                Исходящие телефонные звонки
+            number: telephone number
+            duration: duration of the call
+            caller: telephone number of another side
+            region: region of another side
+    """
+    df = (cache or get_statistic_cache()).read(path, read_raw_statistic)
+    # Drop duplicates
+    df.drop_duplicates(inplace=True)
+    return project_statistic(df)
+
+
+def read_tel_statistic_folder(path, pattern='*.xlsx', max_workers=None, cache=None):
+    """
+    Read ALL files of statistics in folder in parallel processes
+    :param path: folder with Excel exports
+    :param pattern: mask of file names
+    :param max_workers: number of processes, number of CPUs by default
+    :param cache: StatisticCache, shared cache by default; only files missing in it are parsed
+    :return: dataset as read_tel_excel_statistic, duplicates are dropped across all files
+    """
+    cache = cache or get_statistic_cache()
+    files = sorted(glob.glob(os.path.join(path, pattern)))
+    if not files:
+        return project_statistic(pd.DataFrame(columns=list(STATISTIC_COLUMNS)))
+    frames = [cache.get(file) for file in files]
+    missing = [file for file, frame in zip(files, frames) if frame is None]
+    if len(missing) <= 1 or max_workers == 1:
+        parsed = [read_raw_statistic(file) for file in missing]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parsed = list(pool.map(read_raw_statistic, missing))
+    for file, frame in zip(missing, parsed):
+        cache.put(file, frame)
+    parsed = iter(parsed)
+    frames = [next(parsed) if frame is None else frame for frame in frames]
+    df = pd.concat(frames, ignore_index=True)
+    # Одни и те же звонки попадают в соседние выгрузки
+    df.drop_duplicates(inplace=True)
+    return project_statistic(df.reset_index(drop=True))
+
+
+def statistic_calls(df, numbers=None):
+    """
+    Outgoing calls of statistics as typed call history, the report is calculated from them as from CRM calls
+    :param df: dataset returned by read_tel_statistic_folder
+    :param numbers: known phone numbers, see history.typed_calls
+    :return: dataframe with CALL_SCHEMA columns
+    """
+    from history import CALL_ID, CALL_START, typed_calls
+    outgoing = df[df['type'].astype(str).str.contains('Исходящие')]
+    return typed_calls(pd.DataFrame({CALL_ID: None,
+                                     CALL_START: outgoing['date'],
+                                     'diversion': outgoing['number'].astype(str),
+                                     'duration': outgoing['duration']}), numbers)
@@ -0,0 +1,275 @@
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from aggregation import CallIndex, number_totals
+from history import Cancelled
+from reference import REFERENCE
+from tracing import traced
+
+# Строк данных на листе Excel, еще одна строка занята заголовком
+SHEET_ROWS = 1048575
+# Звонки пишутся кусками, память не зависит от числа звонков
+CHUNK = 50000
+FORMATS = ('.xlsx', '.csv', '.parquet')
+CALL_HEADER = ['Начало', 'Номер', 'Отдел', 'Секунд']
+
+
+def sheet_name(name, used):
+    """Valid unique name of Excel sheet: no []:*?/\\ and at most 31 characters"""
+    base = re.sub(r'[\[\]:*?/\\]', ' ', str(name)).strip()[:31] or 'Лист'
+    name, i = base, 2
+    while name.lower() in used:
+        suffix = f' {i}'
+        name, i = base[:31 - len(suffix)] + suffix, i + 1
+    used.add(name.lower())
+    return name
+
+
+def call_chunks(call_history, reference=None, chunk=CHUNK):
+    """
+    Calls with division names by chunks
+    :return: iterator of dataframes with CALL_HEADER columns
+    """
+    reference = reference or REFERENCE
+    index = reference.number_index
+    names = division_names(reference)
+    for first in range(0, len(call_history), chunk):
+        calls = call_history.iloc[first:first + chunk]
+        yield calls_frame(calls, names, index.call_division_codes(calls['diversion']))
+
+
+def file_name(name):
+    """Division name usable as file name, 'Аптека Ленина 30/5' -> 'Аптека Ленина 30 5'"""
+    return re.sub(r'[\\/:*?"<>|]', ' ', str(name)).strip() or 'Отдел'
+
+
+def calls_frame(call_history, division_names, codes):
+    """
+    Calls with CALL_HEADER columns
+    :param division_names: array of names by division code, the last one for unknown numbers
+    :param codes: division codes of calls
+    """
+    start = call_history['start']
+    if start.dt.tz is not None:
+        # Excel не хранит часовой пояс
+        start = start.dt.tz_convert(None)
+    return pd.DataFrame({'Начало': start.to_numpy(),
+                         'Номер': call_history['diversion'].astype(str).to_numpy(),
+                         'Отдел': division_names[codes],
+                         'Секунд': call_history['duration'].to_numpy()})
+
+
+def division_names(reference):
+    """Names by division codes of NumberIndex, the last one is empty for numbers missing in phones"""
+    names = reference.divisions.set_index('id')['name']
+    return np.append(names.reindex(reference.number_index.division_ids).fillna('').to_numpy(dtype=object), '')
+
+
+def division_numbers(report, numbers, reference=None):
+    """
+    Numbers of every division of report
+    :return: list of tuples (division name, dataframe of its numbers)
+    """
+    ids = (reference or REFERENCE).divisions.set_index('name')['id']
+    by_division = dict(tuple(numbers.groupby('division_id')))
+    empty = numbers.iloc[:0]
+    return [(name, by_division.get(ids.get(name), empty).drop(columns='division_id'))
+            for name in report['Отдел']]
+
+
+def _rows(df):
+    """Rows of dataframe as lists of Python values, NaN and NaT become empty cells"""
+    columns = [df[column].astype(object).where(df[column].notna(), None).tolist() for column in df.columns]
+    return zip(*columns)
+
+
+def _check(cancelled):
+    if cancelled is not None and cancelled():
+        raise Cancelled()
+
+
+def write_xlsx(path, report, divisions, chunks, progress=None, cancelled=None):
+    """Workbook in write-only mode: rows go to disk as they are appended"""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    used = set()
+
+    def sheet(name, df):
+        ws = wb.create_sheet(sheet_name(name, used))
+        ws.append(list(df.columns))
+        return ws
+
+    ws = sheet('Итого', report)
+    for row in _rows(report):
+        ws.append(row)
+    for name, numbers in divisions:
+        ws = sheet(name, numbers)
+        for row in _rows(numbers):
+            ws.append(row)
+    ws, written, total = None, SHEET_ROWS, 0
+    for calls in chunks:
+        _check(cancelled)
+        for row in _rows(calls):
+            if written == SHEET_ROWS:
+                ws, written = sheet('Звонки', calls), 0
+            ws.append(row)
+            written += 1
+        total += len(calls)
+        if progress is not None:
+            progress(total)
+    if ws is None:
+        sheet('Звонки', pd.DataFrame(columns=CALL_HEADER))
+    wb.save(path)
+
+
+def _table_paths(path):
+    stem, ext = os.path.splitext(path)
+    return path, f'{stem}_numbers{ext}', f'{stem}_calls{ext}'
+
+
+def write_csv(path, report, numbers, chunks, progress=None, cancelled=None):
+    """Three files: report, numbers of divisions and calls, calls are appended by chunks"""
+    report_path, numbers_path, calls_path = _table_paths(path)
+    report.to_csv(report_path, encoding='utf-8-sig', sep=';', index=False)
+    numbers.to_csv(numbers_path, encoding='utf-8-sig', sep=';', index=False)
+    with open(calls_path, 'w', encoding='utf-8-sig', newline='') as f:
+        f.write(';'.join(CALL_HEADER) + '\n')
+        total = 0
+        for calls in chunks:
+            _check(cancelled)
+            calls.to_csv(f, sep=';', index=False, header=False)
+            total += len(calls)
+            if progress is not None:
+                progress(total)
+
+
+def write_parquet(path, report, numbers, chunks, progress=None, cancelled=None):
+    """Three files as write_csv, calls are written as row groups"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    report_path, numbers_path, calls_path = _table_paths(path)
+    report.to_parquet(report_path, index=False)
+    numbers.to_parquet(numbers_path, index=False)
+    writer = None
+    total = 0
+    try:
+        for calls in chunks:
+            _check(cancelled)
+            table = pa.Table.from_pandas(calls, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(calls_path, table.schema)
+            writer.write_table(table)
+            total += len(calls)
+            if progress is not None:
+                progress(total)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+@traced('save')
+def write_report(report, path):
+    """Report only, without detail of numbers and calls"""
+    if path.lower().endswith('.csv'):
+        report.to_csv(path, encoding='utf-8-sig', sep=';', index=False)
+    elif path.lower().endswith('.parquet'):
+        report.to_parquet(path, index=False)
+    else:
+        report.to_excel(path, index=False)
+
+
+@traced('save')
+def export_report(path, report, call_history, reference=None, progress=None, cancelled=None):
+    """
+    Report with detail of numbers and calls, memory does not grow with number of calls
+    :param path: .xlsx file with sheets Итого, one sheet per division and Звонки,
+        or .csv/.parquet file of report with files *_numbers and *_calls next to it
+    :param report: dataframe returned by build_report
+    :param call_history: typed call history
+    :param reference: ReferenceData of report, REFERENCE by default
+    :param progress: called with number of written calls
+    :param cancelled: returns True when export must stop, Cancelled is raised then
+    """
+    reference = reference or REFERENCE
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f'Unknown format of {path}, expected one of {", ".join(FORMATS)}')
+    numbers = number_totals(call_history, reference.phones)
+    chunks = call_chunks(call_history, reference)
+    if ext == '.xlsx':
+        write_xlsx(path, report, division_numbers(report, numbers, reference), chunks, progress, cancelled)
+    else:
+        names = reference.divisions.set_index('id')['name']
+        numbers.insert(0, 'Отдел', names.reindex(numbers.pop('division_id')).to_numpy())
+        writer = write_csv if ext == '.csv' else write_parquet
+        writer(path, report, numbers, chunks, progress, cancelled)
+
+
+def _write_division(path, summary, numbers, calls):
+    write_xlsx(path, summary, [('Номера', numbers)], [calls])
+    return path
+
+
+@traced('save divisions')
+def export_divisions(folder, report, call_history, reference=None, call_index=None, max_workers=None,
+                     progress=None, cancelled=None):
+    """
+    One workbook per division of report: its summary row, its numbers from phones.csv and its calls
+    :param folder: folder for workbooks Домру_<division>.xlsx
+    :param call_index: CallIndex of call history, calls are partitioned by it once
+    :param max_workers: number of processes, number of CPUs by default
+    :param progress: called with (written workbooks, all workbooks)
+    :param cancelled: returns True when export must stop, Cancelled is raised then
+    :return: list of written files
+    """
+    reference = reference or REFERENCE
+    os.makedirs(folder, exist_ok=True)
+    call_index = call_index or CallIndex(reference.number_index, call_history)
+    ids = reference.divisions.set_index('name')['id']
+    names = division_names(reference)
+    numbers = dict(division_numbers(report, number_totals(call_history, reference.phones), reference))
+    total = len(report)
+
+    def jobs():
+        # Звонки отдела собираются перед отправкой, а не все сразу: иначе в памяти вторая копия истории
+        for position, name in enumerate(report['Отдел']):
+            rows = call_index.rows(ids.get(name))
+            code = call_index.index.division_ids.get_loc(ids[name]) if len(rows) else -1
+            calls = calls_frame(call_history.iloc[rows], names, np.full(len(rows), code))
+            yield (os.path.join(folder, f'Домру_{file_name(name)}.xlsx'), report.iloc[[position]], numbers[name],
+                   calls)
+
+    written = []
+
+    def collect(path):
+        written.append(path)
+        if progress is not None:
+            progress(len(written), total)
+
+    if total <= 1 or max_workers == 1:
+        for job in jobs():
+            _check(cancelled)
+            collect(_write_division(*job))
+        return written
+    # Не больше двух заданий на процесс в очереди, отправленные задания держат свои звонки до записи
+    window = 2 * (max_workers or os.cpu_count() or 1)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        try:
+            for job in jobs():
+                _check(cancelled)
+                pending.append(pool.submit(_write_division, *job))
+                if len(pending) >= window:
+                    collect(pending.popleft().result())
+            while pending:
+                _check(cancelled)
+                collect(pending.popleft().result())
+        finally:
+            for future in pending:
+                future.cancel()
+    return written
@@ -1,6 +1,14 @@
 # -*- coding: utf-8 -*-
+import multiprocessing
 import sys
 
+import pandas as pd
+
+from api_client import get_client
+from excel_statistic import read_tel_statistic_folder
+from report import costs_from_invoice
+from statistic_cache import get_statistic_cache
+from table_model import PandasModel
 
 from PySide6.QtCore import (QCoreApplication, QDate, QDateTime, QLocale,
                             QMetaObject, QObject, QPoint, QRect,
@@ -17,60 +25,6 @@ from PySide6.QtWidgets import (QApplication, QDateEdit, QGroupBox, QHBoxLayout,
                                QListView, QLayout)
 
 
-class PandasModel(QAbstractTableModel):
-    """A model to interface a Qt view with pandas dataframe """
-
-    def __init__(self, dataframe: pd.DataFrame, parent=None):
-        QAbstractTableModel.__init__(self, parent)
-        self._dataframe = dataframe
-
-    def rowCount(self, parent=QModelIndex()) -> int:
-        """ Override method from QAbstractTableModel
-
-        Return row count of the pandas DataFrame
-        """
-        if parent == QModelIndex():
-            return len(self._dataframe)
-
-        return 0
-
-    def columnCount(self, parent=QModelIndex()) -> int:
-        """Override method from QAbstractTableModel
-
-        Return column count of the pandas DataFrame
-        """
-        if parent == QModelIndex():
-            return len(self._dataframe.columns)
-        return 0
-
-    def data(self, index: QModelIndex, role=Qt.ItemDataRole):
-        """Override method from QAbstractTableModel
-
-        Return data cell from the pandas DataFrame
-        """
-        if not index.isValid():
-            return None
-
-        if role == Qt.DisplayRole:
-            return str(self._dataframe.iloc[index.row(), index.column()])
-
-        return None
-
-    def headerData(self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole):
-        """Override method from QAbstractTableModel
-
-        Return dataframe index as vertical header data and columns as horizontal header data.
-        """
-        if role == Qt.DisplayRole:
-            if orientation == Qt.Horizontal:
-                return str(self._dataframe.columns[section])
-
-            if orientation == Qt.Vertical:
-                return str(self._dataframe.index[section])
-
-        return None
-
-
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         if not MainWindow.objectName():
@@ -475,28 +429,13 @@ class Ui_MainWindow(object):
             "PDF (*.pdf)"
         )
         if path[0]:
-            table = parse_pdf(path[0])
-            divisions_cost = 0
-            personal_cost = 0
-            subscription_cost = 0
-            minutes_cost = 0
-            for row in table:
-                value = row[1].replace(',', '.').replace(' ', '')
-                if 'Дополнительная группа пользователей' in row[0]:
-                    divisions_cost += float(value)
-                if 'Дополнительные внутренние номера' in row[0]:
-                    personal_cost += float(value)
-                if 'Безлимитная запись' in row[0] or \
-                        'ОАТС Про' in row[0] or \
-                        'Интеграция с CRM' in row[0] or \
-                        'Алгоритм распред' in row[0]:
-                    subscription_cost += float(value)
-                if 'Минут' in row[0] or 'Соединения по сети передачи данных' in row[0]:
-                    minutes_cost += float(value)
-            self.le_divisions_cost.setText(str(round(divisions_cost, 2)))
-            self.le_personal.setText(str(round(personal_cost, 2)))
-            self.le_subscription.setText(str(round(subscription_cost, 2)))
-            self.le_minuts.setText(str(round(minutes_cost, 2)))
+            costs = costs_from_invoice(path[0])
+            self.le_divisions_cost.setText(str(round(costs['divisions'], 2)))
+            self.le_personal.setText(str(round(costs['personal'], 2)))
+            self.le_subscription.setText(str(round(costs['subscription'], 2)))
+            self.le_minuts.setText(str(round(costs['minutes'], 2)))
+            if len(costs['unmatched']):
+                self.statusbar.showMessage(f'Не распознано строк счета: {len(costs["unmatched"])}')
 
     def save_report(self):
         s_fname = QFileDialog.getSaveFileName(
@@ -509,7 +448,11 @@ class Ui_MainWindow(object):
             self.to_model.to_excel(s_fname[0], index=False)
 
     def read(self):
-        df = read_tel_statistic()
+        path = QFileDialog.getExistingDirectory(self.centralwidget, "Папка со статистикой")
+        if not path:
+            return
+        df = read_tel_statistic_folder(path)
+        self.statusbar.showMessage(get_statistic_cache().status())
         start_date = str(min(df.date)).split()[0]
         end_date = str(max(df.date)).split()[0]
         y_min = int(start_date.split('-')[0])
@@ -559,12 +502,6 @@ class Ui_MainWindow(object):
 
     def request_history(self, start_date_='', end_date='', period='last_month'):
         global CALL_HISTORY
-        with open(r'config/cfg.json', 'r') as f:
-            text = json.load(f)
-        token = text['token']
-        path_to_api = text['path_to_api']
-        json_history = '/crmapi/v1/history/json'
-        headers = {'X-API-KEY': token}
         params = {'type': 'out'}
         # TODO
 #        if start_date_ != '':
@@ -573,8 +510,7 @@ class Ui_MainWindow(object):
 #            params['end'] = end_date
         if period != '':
             params['period'] = period
-        r = requests.get(path_to_api + json_history, headers=headers, params=params)
-        df = pd.json_normalize(r.json())
+        df = pd.json_normalize(get_client().history(params))
         CALL_HISTORY = df.query('status == "success"')
         self.calculate2(df.query('status == "success"'))
 #        return df.query('status == "success"')
@@ -625,6 +561,8 @@ class MainWindow(QMainWindow):
 
 
 if __name__ == "__main__":
+    # Для exe из PyInstaller: дочерние процессы ProcessPoolExecutor не должны запускать окно
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     widget = MainWindow()
     widget.show()
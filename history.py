@@ -0,0 +1,261 @@
+import codecs
+import datetime
+import json
+import re
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from api_client import HISTORY, RETRY_STATUSES, CrmApiError, get_client
+from reference import REFERENCE
+from tracing import traced
+
+# Поля записи звонка в ответе /crmapi/v1/history/json
+CALL_ID = 'uid'
+CALL_START = 'start'
+API_DATE_FORMAT = '%Y%m%dT%H%M%SZ'
+# Поля, которые нужны для расчета, остальные отбрасываются при чтении ответа
+CALL_COLUMNS = [CALL_ID, CALL_START, 'status', 'diversion', 'duration']
+CHUNK_SIZE = 64 * 1024
+# Типы столбцов истории звонков после загрузки
+CALL_SCHEMA = {CALL_ID: 'string',
+               CALL_START: 'datetime64[ns, UTC]',
+               'diversion': 'category',
+               'duration': 'int32'}
+
+
+class Cancelled(Exception):
+    """Task was cancelled by user"""
+
+
+def period_bounds(period, today=None):
+    """
+    First and last moment of named period of CRM API
+    :param period: last_month, this_month, last_week, this_week, yesterday or today
+    :param today: date to count from, today by default
+    :return: tuple (start, end) of datetimes, end is the last second of the period
+    """
+    today = today or datetime.date.today()
+    if period == 'today':
+        first, last = today, today
+    elif period == 'yesterday':
+        first = last = today - datetime.timedelta(days=1)
+    elif period == 'this_week':
+        first, last = today - datetime.timedelta(days=today.weekday()), today
+    elif period == 'last_week':
+        last = today - datetime.timedelta(days=today.weekday() + 1)
+        first = last - datetime.timedelta(days=6)
+    elif period == 'this_month':
+        first, last = today.replace(day=1), today
+    elif period == 'last_month':
+        last = today.replace(day=1) - datetime.timedelta(days=1)
+        first = last.replace(day=1)
+    else:
+        raise ValueError(f'Unknown period: {period}')
+    start = datetime.datetime.combine(first, datetime.time.min)
+    end = datetime.datetime.combine(last, datetime.time(23, 59, 59))
+    return start, end
+
+
+def parse_api_date(value):
+    return datetime.datetime.strptime(value, API_DATE_FORMAT)
+
+
+def split_range(start, end, window=datetime.timedelta(days=1)):
+    """
+    Split period into windows
+    :param start: first moment of period
+    :param end: last moment of period
+    :param window: length of one window
+    :return: list of (start, end) tuples in API date format, windows do not overlap
+    """
+    windows = []
+    current = start
+    while current <= end:
+        window_end = min(current + window - datetime.timedelta(seconds=1), end)
+        windows.append((current.strftime(API_DATE_FORMAT), window_end.strftime(API_DATE_FORMAT)))
+        current = window_end + datetime.timedelta(seconds=1)
+    return windows
+
+
+def iter_json_array(chunks):
+    """
+    Read objects of JSON array one by one without keeping the whole document
+    :param chunks: iterable of bytes, such as response.iter_content()
+    :return: generator of decoded array items
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    separators = re.compile(r'[\s,]*')
+    buffer = ''
+    opened = False
+    for chunk in chunks:
+        buffer += text.decode(chunk)
+        pos = 0
+        while True:
+            pos = separators.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            if not opened:
+                if buffer[pos] != '[':
+                    raise ValueError('History is not a JSON array')
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                item, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # объект еще не дочитан, ждем следующий кусок
+                break
+            yield item
+        buffer = buffer[pos:]
+    if opened or buffer.strip():
+        raise ValueError('History JSON is truncated')
+
+
+@traced('parse')
+def read_calls(chunks):
+    """
+    Stream successful calls of history response into column buffers
+    :param chunks: iterable of bytes of /crmapi/v1/history/json response
+    :return: dataframe with CALL_COLUMNS
+    """
+    uid, start, diversion = [], [], []
+    duration = array('i')
+    for call in iter_json_array(chunks):
+        if call.get('status') != 'success':
+            continue
+        uid.append(None if call.get(CALL_ID) is None else str(call[CALL_ID]))
+        start.append(call.get(CALL_START))
+        diversion.append(str(call.get('diversion')))
+        duration.append(int(call.get('duration') or 0))
+    return pd.DataFrame({CALL_ID: uid,
+                         CALL_START: start,
+                         'status': 'success',
+                         'diversion': diversion,
+                         'duration': duration}, columns=CALL_COLUMNS)
+
+
+def typed_calls(df, numbers=None):
+    """
+    Convert calls to CALL_SCHEMA and drop all other columns
+    :param df: dataframe with CALL_COLUMNS
+    :param numbers: known phone numbers, categories of diversion start with them in this order
+    :return: dataframe with CALL_SCHEMA columns
+    :raise ValueError: when some start dates are not ISO 8601, such calls would drop out of totals
+    """
+    if numbers is None:
+        numbers = REFERENCE.phones['number']
+    known = pd.Index(numbers, dtype=str).unique()
+    diversion = df['diversion'].astype(str)
+    categories = known.append(pd.Index(diversion.unique(), dtype=str).difference(known, sort=False))
+    start = pd.to_datetime(df[CALL_START], utc=True, errors='coerce', format='ISO8601')
+    coerced = start.isna() & df[CALL_START].notna()
+    if coerced.any():
+        raise ValueError(f'{int(coerced.sum())} of {len(df)} calls have start dates which are not ISO 8601, '
+                         f'for example {df[CALL_START][coerced].iloc[0]!r}')
+    return pd.DataFrame({CALL_ID: df[CALL_ID].astype(CALL_SCHEMA[CALL_ID]),
+                         CALL_START: start.astype(CALL_SCHEMA[CALL_START]),
+                         'diversion': pd.Categorical(diversion, categories=categories),
+                         'duration': df['duration'].astype(CALL_SCHEMA['duration'])})
+
+
+def empty_calls():
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in CALL_SCHEMA.items()})
+
+
+@traced('merge')
+def merge_calls(frames, numbers=None):
+    """
+    Merge calls fetched by windows into one typed dataframe of successful calls
+    :param frames: dataframes returned by read_calls
+    :param numbers: known phone numbers, see typed_calls
+    :return: dataframe with CALL_SCHEMA columns
+    """
+    frames = list(frames)
+    if not frames:
+        return empty_calls()
+    df = pd.concat(frames, ignore_index=True)
+    # Без идентификатора звонка дубликаты ищем по всем полям
+    subset = CALL_ID if df[CALL_ID].notna().all() else None
+    return typed_calls(df.drop_duplicates(subset=subset).reset_index(drop=True), numbers)
+
+
+def fetch_windows(start, end, window=datetime.timedelta(days=1), max_workers=8, client=None, params=None,
+                  progress=None, cancelled=None):
+    """
+    Fetch calls of period by concurrent requests of smaller windows
+    :param start: first moment of period
+    :param end: last moment of period
+    :param window: length of one request window
+    :return: list of dataframes of calls, one per window
+    """
+    return fetch_window_list(split_range(start, end, window), max_workers, client, params, progress, cancelled)
+
+
+def fetch_window_list(windows, max_workers=8, client=None, params=None, progress=None, cancelled=None):
+    """
+    Fetch calls of every window by concurrent requests
+    :param windows: list of (start, end) tuples in API date format
+    :param max_workers: number of threads, concurrent requests are also limited by client.limit
+    :param client: CrmClient, shared client by default
+    :param params: extra query parameters
+    :param progress: called with (done, total) windows after each window
+    :param cancelled: returns True when remaining windows must not be fetched
+    :return: list of dataframes of calls, one per window
+    """
+    client = client or get_client()
+    # Один лимит на клиента: месяцы batch и аккаунты не превышают пул соединений вместе
+    limit = client.limit
+    done = [0]
+    done_lock = threading.Lock()
+
+    def fetch(bounds):
+        query = dict(params or {}, start=bounds[0], end=bounds[1])
+        for attempt in range(client.retries + 1):
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+            try:
+                # Ошибка освобождает слот, чтобы повтор ждал своей очереди
+                with limit:
+                    response = client.get(HISTORY, query, retries=0, stream=True)
+                    with response:
+                        calls = read_calls(response.iter_content(CHUNK_SIZE))
+                break
+            except (CrmApiError, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError) as e:
+                # Обрыв при чтении тела ответа повторяем так же, как ошибку соединения
+                status = e.status if isinstance(e, CrmApiError) else None
+                if (status is not None and status not in RETRY_STATUSES) or attempt == client.retries:
+                    raise
+                if status == 429:
+                    # Параллельность снижаем только когда CRM просит об этом
+                    limit.throttle()
+                client.wait_before_retry(attempt, e.retry_after if isinstance(e, CrmApiError) else None)
+        if progress is not None:
+            with done_lock:
+                done[0] += 1
+                progress(done[0], len(windows))
+        return calls
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(fetch, windows))
+
+
+def request_history_windowed(start_date_='', end_date='', period='last_month', window_days=1, max_workers=8,
+                             client=None, progress=None, cancelled=None, numbers=None):
+    """
+    Same as request_history, but period is fetched by concurrent windows of window_days days
+    """
+    if period != '':
+        start, end = period_bounds(period)
+    else:
+        start, end = parse_api_date(start_date_), parse_api_date(end_date)
+    chunks = fetch_windows(start, end, datetime.timedelta(days=window_days), max_workers, client,
+                           params={'type': 'out'}, progress=progress, cancelled=cancelled)
+    return merge_calls(chunks, numbers)
@@ -0,0 +1,84 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Затраты, которые заполняются из счета
+COSTS = ('divisions', 'personal', 'subscription', 'minutes')
+# Строки счета, которые не относятся к затратам, например итоги
+IGNORE = 'ignore'
+
+
+class InvoiceClassifier:
+    """Line items of invoice -> costs by rules from invoice_rules.csv
+
+    Every rule is a substring of service name, all rules are compiled into one
+    regular expression with a named group per cost. The first rule found in the
+    name wins. Amounts of all rows are parsed at once and summed with bincount.
+    """
+
+    def __init__(self, rules):
+        """
+        :param rules: dataframe with columns cost, pattern
+        """
+        self.costs = list(dict.fromkeys(rules['cost']))
+        self._groups = {f'c{i}': cost for i, cost in enumerate(self.costs)}
+        self._codes = {f'c{i}': i for i in range(len(self.costs))}
+        self.pattern = re.compile('|'.join(
+            f'(?P<{group}>' + '|'.join(re.escape(pattern) for pattern in rules.loc[rules['cost'] == cost, 'pattern'])
+            + ')' for group, cost in self._groups.items()))
+
+    @classmethod
+    def from_csv(cls, path):
+        return cls(pd.read_csv(path, sep=';', dtype=str))
+
+    def match(self, name):
+        """
+        :return: cost of service name or None
+        """
+        found = self.pattern.search(name or '')
+        return self._groups[found.lastgroup] if found else None
+
+    def _parse(self, rows):
+        """Names, rule codes (-1 without rule) and amounts (NaN without amount) of rows"""
+        names = np.array([(row[0] or '') if row else '' for row in rows], dtype=object)
+        codes = np.array([self._codes[found.lastgroup] if found else -1
+                          for found in map(self.pattern.search, names)], dtype=np.int64)
+        amounts = pd.Series([row[1] if len(row) > 1 else None for row in rows], dtype=object)
+        amounts = pd.to_numeric(amounts.str.replace(r'\s', '', regex=True).str.replace(',', '.'),
+                                errors='coerce').to_numpy(dtype=float)
+        return names, codes, amounts
+
+    def items(self, rows):
+        """
+        Line items with amount
+        :return: dataframe with columns name, amount, cost; cost is None for rows without rule
+        """
+        names, codes, amounts = self._parse(rows)
+        has_amount = ~np.isnan(amounts)
+        costs = np.array(self.costs + [None], dtype=object)[codes[has_amount]]
+        return pd.DataFrame({'name': names[has_amount], 'amount': amounts[has_amount], 'cost': costs})
+
+    def classify(self, rows):
+        """
+        :param rows: rows of invoice tables: service name, amount and other cells, cells may be None
+        :return: tuple (costs, unmatched): dict cost -> sum, dataframe of rows with amount and without rule
+        """
+        names, codes, amounts = self._parse(rows)
+        has_amount = ~np.isnan(amounts)
+        matched = codes >= 0
+        sums = np.bincount(codes[matched & has_amount], weights=amounts[matched & has_amount],
+                           minlength=len(self.costs))
+        unmatched = ~matched & has_amount
+        return (self.summarize(zip(self.costs, sums)),
+                pd.DataFrame({'name': names[unmatched], 'amount': amounts[unmatched]}))
+
+    @staticmethod
+    def summarize(sums):
+        """
+        :param sums: pairs (cost, sum)
+        :return: dict with every cost of COSTS, ignored lines are left out
+        """
+        result = {cost: 0.0 for cost in COSTS}
+        result.update({cost: float(value) for cost, value in sums if cost not in (IGNORE, None)})
+        return result
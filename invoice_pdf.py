@@ -0,0 +1,94 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from reference import CACHE_DIR
+from statistic_cache import file_hash
+
+# Отступ вокруг таблицы услуг, пунктов
+MARGIN = 3
+
+
+def items_bbox(page):
+    """
+    Region of line items on page: bounds of table ruling, text is not laid out for it
+    :return: bbox (x0, top, x1, bottom), the whole page when page has no ruling
+    """
+    edges = page.lines + page.rects
+    if not edges:
+        return page.bbox
+    return (max(min(edge['x0'] for edge in edges) - MARGIN, page.bbox[0]),
+            max(min(edge['top'] for edge in edges) - MARGIN, page.bbox[1]),
+            min(max(edge['x1'] for edge in edges) + MARGIN, page.bbox[2]),
+            min(max(edge['bottom'] for edge in edges) + MARGIN, page.bbox[3]))
+
+
+def table_rows(page):
+    """Rows of all tables on page, detection is limited to the line items region"""
+    region = page.crop(items_bbox(page))
+    return [row for table in region.extract_tables() for row in table]
+
+
+def page_rows(path, page_number):
+    # pdfplumber загружается долго, нужен только для счетов
+    import pdfplumber
+    with pdfplumber.open(path, pages=[page_number + 1]) as pdf:
+        return table_rows(pdf.pages[0])
+
+
+def page_count(path):
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+class InvoiceCache:
+    """Rows extracted from invoices, one JSON file per content hash"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, 'invoices')
+        os.makedirs(self.path, exist_ok=True)
+
+    def _rows_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def get(self, key):
+        try:
+            with open(self._rows_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, rows):
+        tmp = self._rows_path(key) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False)
+        os.replace(tmp, self._rows_path(key))
+
+
+def extract_invoice_rows(path, max_workers=None, cache=None):
+    """
+    Rows of line items from all pages of invoice, pages are parsed in parallel processes
+    :param path: PDF file
+    :param max_workers: number of processes, number of CPUs by default
+    :param cache: InvoiceCache, False to parse without cache
+    :return: list of rows in page order, cells are strings or None
+    """
+    if cache is None:
+        cache = InvoiceCache()
+    key = file_hash(path) if cache else None
+    rows = cache.get(key) if cache else None
+    if rows is not None:
+        return rows
+    pages = range(page_count(path))
+    if len(pages) <= 1 or max_workers == 1:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            by_page = [table_rows(page) for page in pdf.pages]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers or os.cpu_count(), len(pages))) as pool:
+            by_page = list(pool.map(page_rows, [path] * len(pages), pages))
+    rows = [row for page in by_page for row in page]
+    if cache:
+        cache.put(key, rows)
+    return rows
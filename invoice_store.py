@@ -0,0 +1,165 @@
+import datetime
+import glob
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from invoice_classifier import InvoiceClassifier
+from invoice_pdf import InvoiceCache, extract_invoice_rows
+from reference import CACHE_DIR, REFERENCE
+from statistic_cache import file_hash
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS invoices (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    month TEXT NOT NULL,
+    imported_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    hash TEXT NOT NULL,
+    month TEXT NOT NULL,
+    cost TEXT,
+    name TEXT NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_month_cost ON items (month, cost);
+CREATE INDEX IF NOT EXISTS items_hash ON items (hash);
+'''
+MONTHS = ['январ', 'феврал', 'март', 'апрел', 'ма[йя]', 'июн', 'июл', 'август', 'сентябр', 'октябр', 'ноябр',
+          'декабр']
+# Месяц в имени файла: 2024-01, 2024.01, 01.2024
+FILE_MONTH = re.compile(r'(?P<year>20\d\d)[-._](?P<month>[01]\d)(?!\d)|(?<!\d)(?P<month2>[01]\d)[-._](?P<year2>20\d\d)')
+# Месяц в тексте счета: за январь 2024
+TEXT_MONTH = re.compile('(?P<name>' + '|'.join(MONTHS) + r')\w*\s+(?P<year>20\d\d)', re.IGNORECASE)
+
+
+def invoice_month(path, text=None):
+    """
+    Month of invoice from file name or, when the name has none, from text of the first page
+    :return: first day of month or None
+    """
+    found = FILE_MONTH.search(os.path.basename(path))
+    if found:
+        year, month = found['year'] or found['year2'], found['month'] or found['month2']
+        if 1 <= int(month) <= 12:
+            return datetime.date(int(year), int(month), 1)
+    if text is None:
+        # pdfplumber загружается долго, нужен только для счетов
+        import pdfplumber
+        with pdfplumber.open(path, pages=[1]) as pdf:
+            text = pdf.pages[0].extract_text() or ''
+    found = TEXT_MONTH.search(text)
+    if found:
+        month = next(i for i, name in enumerate(MONTHS, 1) if re.match(name, found['name'], re.IGNORECASE))
+        return datetime.date(int(found['year']), month, 1)
+    return None
+
+
+def read_invoice(path):
+    """Rows and month of one invoice, runs in worker processes"""
+    return extract_invoice_rows(path, max_workers=1, cache=InvoiceCache()), invoice_month(path)
+
+
+class InvoiceStore:
+    """Local SQLite store of classified invoice line items
+
+    Invoices are identified by content hash, so a file is imported once
+    whatever its name. Items are indexed by month and cost.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, 'invoices.sqlite')
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as con:
+            con.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path)
+
+    def imported(self, hashes):
+        """
+        :return: set of hashes which are already in store
+        """
+        with self._connect() as con:
+            known = {row[0] for row in con.execute('SELECT hash FROM invoices')}
+        return known & set(hashes)
+
+    def put(self, key, path, month, items):
+        """
+        Replace line items of invoice
+        :param key: content hash of file
+        :param month: first day of invoice month
+        :param items: dataframe returned by InvoiceClassifier.items
+        """
+        month = month.isoformat()[:7]
+        rows = ((key, month, cost, name, float(amount)) for name, amount, cost in
+                items[['name', 'amount', 'cost']].itertuples(index=False))
+        with self._lock, self._connect() as con:
+            con.execute('DELETE FROM items WHERE hash = ?', (key,))
+            con.executemany('INSERT INTO items (hash, month, cost, name, amount) VALUES (?, ?, ?, ?, ?)', rows)
+            con.execute('INSERT OR REPLACE INTO invoices (hash, path, month, imported_at) VALUES (?, ?, ?, ?)',
+                        (key, os.path.abspath(path), month, datetime.datetime.now().isoformat()))
+
+    def months(self):
+        """
+        :return: sorted list of first days of months with invoices
+        """
+        with self._connect() as con:
+            rows = con.execute('SELECT DISTINCT month FROM invoices ORDER BY month').fetchall()
+        return [datetime.date.fromisoformat(row[0] + '-01') for row in rows]
+
+    def costs(self, month):
+        """
+        Costs of month as costs_from_invoice returns them
+        :param month: any date of month
+        :return: dict with divisions, personal, subscription and minutes costs or None when month has no invoices
+        """
+        key = month.isoformat()[:7]
+        with self._connect() as con:
+            if con.execute('SELECT 1 FROM invoices WHERE month = ? LIMIT 1', (key,)).fetchone() is None:
+                return None
+            sums = con.execute('SELECT cost, SUM(amount) FROM items WHERE month = ? AND cost IS NOT NULL '
+                               'GROUP BY cost', (key,)).fetchall()
+        return InvoiceClassifier.summarize(sums)
+
+
+def import_invoice_folder(path, pattern='*.pdf', max_workers=None, store=None, reference=None):
+    """
+    Extract, classify and store every invoice in folder, files already in store are skipped
+    :param path: folder with invoice PDFs
+    :param max_workers: number of processes, number of CPUs by default
+    :param store: InvoiceStore, shared file in CACHE_DIR by default
+    :param reference: ReferenceData with rules of line items, REFERENCE by default
+    :return: dict with imported and skipped files, files without month and unmatched line items
+    """
+    store = store or InvoiceStore()
+    classifier = (reference or REFERENCE).invoice_classifier
+    files = sorted(glob.glob(os.path.join(path, pattern)))
+    hashes = [file_hash(file) for file in files]
+    known = store.imported(hashes)
+    new = [(file, key) for file, key in zip(files, hashes) if key not in known]
+    result = {'imported': [], 'skipped': len(files) - len(new), 'no_month': [], 'unmatched': 0}
+    if len(new) <= 1 or max_workers == 1:
+        parsed = (read_invoice(file) for file, _ in new)
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=max_workers)
+        parsed = pool.map(read_invoice, [file for file, _ in new])
+    try:
+        for (file, key), (rows, month) in zip(new, parsed):
+            # О счетах без месяца и нераспознанных строках сообщает вызывающий по result
+            if month is None:
+                result['no_month'].append(file)
+                continue
+            items = classifier.items(rows)
+            result['unmatched'] += int(items['cost'].isna().sum())
+            store.put(key, file, month, items)
+            result['imported'].append(file)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return result
@@ -1,68 +1,27 @@
+import multiprocessing
 import sys
 
-import pandas as pd
 import datetime
-import pdfplumber
-from PySide6.QtCore import QDate, QAbstractTableModel, QModelIndex, Qt, QStringListModel
+from PySide6.QtCore import QDate, QStringListModel, Qt, QTimer
 
 from ui_form import Ui_MainWindow
-from PySide6.QtWidgets import (QApplication, QMainWindow, QTableWidget, QFileDialog)
-import requests
-import json
-
-class PandasModel(QAbstractTableModel):
-    """A model to interface a Qt view with pandas dataframe """
-
-    def __init__(self, dataframe: pd.DataFrame, parent=None):
-        QAbstractTableModel.__init__(self, parent)
-        self._dataframe = dataframe
-
-    def rowCount(self, parent=QModelIndex()) -> int:
-        """ Override method from QAbstractTableModel
-
-        Return row count of the pandas DataFrame
-        """
-        if parent == QModelIndex():
-            return len(self._dataframe)
-
-        return 0
-
-    def columnCount(self, parent=QModelIndex()) -> int:
-        """Override method from QAbstractTableModel
-
-        Return column count of the pandas DataFrame
-        """
-        if parent == QModelIndex():
-            return len(self._dataframe.columns)
-        return 0
-
-    def data(self, index: QModelIndex, role=Qt.ItemDataRole):
-        """Override method from QAbstractTableModel
-
-        Return data cell from the pandas DataFrame
-        """
-        if not index.isValid():
-            return None
-
-        if role == Qt.DisplayRole:
-            return str(self._dataframe.iloc[index.row(), index.column()])
-
-        return None
-
-    def headerData(self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole):
-        """Override method from QAbstractTableModel
-
-        Return dataframe index as vertical header data and columns as horizontal header data.
-        """
-        if role == Qt.DisplayRole:
-            if orientation == Qt.Horizontal:
-                return str(self._dataframe.columns[section])
-
-            if orientation == Qt.Vertical:
-                return str(self._dataframe.index[section])
-
-        return None
-
+from PySide6.QtWidgets import (QApplication, QMainWindow, QTableWidget, QFileDialog, QPushButton,
+                               QLabel, QLineEdit, QVBoxLayout, QCheckBox)
+
+from aggregation import CallIndex, division_details
+from api_client import get_client
+from drilldown import DrillDownDialog
+from excel_statistic import read_tel_statistic_folder, statistic_calls
+from export import export_divisions, export_report, write_report
+from history import empty_calls, period_bounds
+from memory_profile import PROFILER
+from reference import REFERENCE
+from report import build_report, costs_from_invoice, request_history
+from statistic_cache import get_statistic_cache
+from table_model import PandasModel
+from tracing import TRACER, span
+from transport import RECORD, REPLAY
+from workers import TaskRunner
 
 class Window(QMainWindow):
     periods = {'Прошлый месяц': 'last_month',
@@ -75,13 +34,15 @@ class Window(QMainWindow):
                }
     custom_dates = False
     period = 'Прошлый месяц'
-    call_history = pd.DataFrame()
 
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.call_history = empty_calls()
+        self.call_index = None
         self.divisions = None
         self.phones = None
         self.to_model = None
+        self.report_calls = None
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
         self.add_functions()
@@ -91,8 +52,57 @@ class Window(QMainWindow):
         self.ui.comboBox.currentTextChanged.connect(self.enable_dates)
         self.ui.btn_request.clicked.connect(self.request_from_api)
         self.ui.btn_from_invoice.clicked.connect(self.from_invoice)
+        self.btn_import_invoices = QPushButton('Счета из папки')
+        self.btn_import_invoices.clicked.connect(self.import_invoices)
+        self.ui.horizontalLayout.addWidget(self.btn_import_invoices)
+        self.btn_read_statistic = QPushButton('Статистика из папки')
+        self.btn_read_statistic.clicked.connect(self.read_statistic)
+        self.ui.horizontalLayout.addWidget(self.btn_read_statistic)
+        self.invoice_store = None
+        self.ui.comboBox.currentTextChanged.connect(self.fill_stored_costs)
+        self.ui.start_date.dateChanged.connect(self.fill_stored_costs)
+        QTimer.singleShot(0, self.fill_stored_costs)
         self.ui.btn_calculate.clicked.connect(self.calculate)
         self.ui.btn_save_report.clicked.connect(self.save_report)
+        # Детализация по номерам и звонкам сохраняется долго, по умолчанию только итог
+        self.cb_detail = QCheckBox('С детализацией')
+        self.ui.verticalLayout_2.addWidget(self.cb_detail)
+        self.btn_division_files = QPushButton('Файлы по отделам')
+        self.btn_division_files.setEnabled(False)
+        self.btn_division_files.clicked.connect(self.save_division_files)
+        self.ui.verticalLayout_2.addWidget(self.btn_division_files)
+        self.tasks = TaskRunner()
+        self.btn_cancel = QPushButton('Отмена')
+        self.btn_cancel.setVisible(False)
+        self.btn_cancel.clicked.connect(self.cancel_tasks)
+        self.ui.statusbar.addPermanentWidget(self.btn_cancel)
+        if TRACER.enabled:
+            # Время этапов последней задачи, включается DOMRU_TRACE=1
+            self.lbl_timing = QLabel()
+            self.ui.statusbar.addPermanentWidget(self.lbl_timing)
+            self.btn_trace = QPushButton('Трассировка')
+            self.btn_trace.clicked.connect(self.save_trace)
+            self.ui.statusbar.addPermanentWidget(self.btn_trace)
+        if PROFILER.enabled:
+            # Память этапов запрос, расчет, сохранение, включается DOMRU_MEMORY=1
+            self.lbl_memory = QLabel()
+            self.ui.statusbar.addPermanentWidget(self.lbl_memory)
+        self.le_report_filter = QLineEdit()
+        self.le_report_filter.setPlaceholderText('Фильтр: отдел или общая сумма от')
+        self.le_report_filter.textChanged.connect(self.filter_report)
+        self.ui.gridLayout.removeWidget(self.ui.tableView)
+        report_layout = QVBoxLayout()
+        report_layout.addWidget(self.le_report_filter)
+        report_layout.addWidget(self.ui.tableView)
+        self.ui.gridLayout.addLayout(report_layout, 0, 2, 1, 1)
+        self.le_phones_filter = QLineEdit()
+        self.le_phones_filter.setPlaceholderText('Фильтр: номер или описание')
+        self.le_phones_filter.textChanged.connect(self.filter_phones)
+        self.ui.verticalLayout_5.insertWidget(1, self.le_phones_filter)
+        self.ui.tableView.doubleClicked.connect(self.drill_down)
+        for view in (self.ui.tableView, self.ui.tw_phones):
+            view.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            view.setSortingEnabled(True)
 
         self.ui.le_subscription.setText('4500')
         self.ui.le_personal.setText('10600')
@@ -101,10 +111,33 @@ class Window(QMainWindow):
         self.ui.le_cost_for_number.setText('160')
 #        self.ui.tabWidget.currentChanged.connect(self.load_settings)
         self.ui.lv_divisions.clicked.connect(self.get_info)
-        self.phones = get_phones()
-        self.divisions = load_divisions()
-        self.set_settings(self.divisions, self.phones)
         self.ui.btn_save_divisions.setDisabled(True)
+        self.show_transport()
+        # Численность отдела Пронина запрашивается в CRM, окно не ждет ответа
+        self.run_task('reference', lambda worker: (REFERENCE.divisions, REFERENCE.phones), self.reference_loaded,
+                      'Загрузка справочников...', 'Ошибка при загрузке справочников!')
+
+    def reference_loaded(self, result):
+        self.divisions, self.phones = result
+        self.set_settings(self.divisions, self.phones)
+        self.show_reference_error()
+
+    def show_reference_error(self):
+        """Tell that employees are taken from divisions.csv, the next request asks CRM again"""
+        if REFERENCE.user_counts_error is not None:
+            self.ui.statusbar.showMessage(f'CRM недоступен, сотрудники Прониной взяты из divisions.csv: '
+                                          f'{REFERENCE.user_counts_error}')
+
+    def show_transport(self):
+        """Mark window title when CRM answers are recorded or replayed from disk"""
+        try:
+            mode = get_client().transport
+        except (OSError, ValueError) as e:
+            print(f'Transport of CRM client is unknown: {e}')
+            return
+        titles = {RECORD: 'запись ответов CRM', REPLAY: 'ответы CRM с диска'}
+        if mode in titles:
+            self.setWindowTitle(f'{self.windowTitle()} ({titles[mode]})')
 
     def get_info(self):
         self.ui.btn_save_divisions.setEnabled(True)
@@ -118,9 +151,34 @@ class Window(QMainWindow):
         phones_by_division.columns = ['Номер', 'Описание']
         model = PandasModel(phones_by_division)
         self.ui.tw_phones.setModel(model)
+        self.filter_phones(self.le_phones_filter.text())
         self.ui.tw_phones.resizeColumnsToContents()
         # self.tw_phones.inde
 
+    def filter_report(self, text):
+        """Filter report by division name or by minimal total cost"""
+        model = self.ui.tableView.model()
+        if model is None:
+            return
+        text = text.strip()
+        if not text:
+            model.set_filter(None)
+            return
+        try:
+            model.set_filter(model.mask_at_least('Общая сумма', float(text.replace(',', '.'))))
+        except ValueError:
+            model.set_filter(model.mask_contains('Отдел', text))
+
+    def filter_phones(self, text):
+        model = self.ui.tw_phones.model()
+        if model is None:
+            return
+        text = text.strip()
+        if not text:
+            model.set_filter(None)
+            return
+        model.set_filter(model.mask_contains('Номер', text) | model.mask_contains('Описание', text))
+
     def set_settings(self, _divisions, _phones):
         div = _divisions['name'].tolist()
         div.sort()
@@ -136,39 +194,83 @@ class Window(QMainWindow):
             self.ui.centralwidget,
             "Сохранить файл",
             filename,
-            "XLSX (*.xlsx)"
+            "XLSX (*.xlsx);;CSV (*.csv);;Parquet (*.parquet)"
         )
         if s_fname[0]:
-            self.to_model.to_excel(s_fname[0], index=False)
+            report, call_history = self.to_model, self.report_calls
+            detail = self.cb_detail.isChecked()
+
+            def export(worker):
+                def progress(done):
+                    worker.report(f'Сохранение: {done} из {len(call_history)} звонков')
+
+                with PROFILER.stage('save'):
+                    if detail:
+                        export_report(s_fname[0], report, call_history, progress=progress,
+                                      cancelled=worker.is_cancelled)
+                    else:
+                        write_report(report, s_fname[0])
+
+            self.run_task('export', export, self.report_saved, 'Сохранение отчета...', 'Ошибка при сохранении отчета!')
+
+    def save_division_files(self):
+        folder = QFileDialog.getExistingDirectory(self.ui.centralwidget, "Папка для файлов по отделам")
+        if not folder:
+            return
+        report, call_history = self.to_model, self.report_calls
+        # Индекс звонков по отделам уже построен при загрузке, если отчет посчитан по тем же звонкам
+        call_index = self.call_index if call_history is self.call_history else None
+
+        def export(worker):
+            return export_divisions(folder, report, call_history, call_index=call_index,
+                                    progress=lambda done, total: worker.report(f'Сохранение: {done} из {total} файлов'),
+                                    cancelled=worker.is_cancelled)
+
+        self.run_task('division_files', export, self.division_files_saved, 'Сохранение файлов по отделам...',
+                      'Ошибка при сохранении файлов по отделам!')
+
+    def division_files_saved(self, files):
+        self.ui.statusbar.showMessage(f'Сохранено файлов: {len(files)}', 2000)
+
+    def report_saved(self, result):
+        self.ui.statusbar.showMessage('Отчет сохранен', 2000)
 
     def calculate(self):
-        # Считаем затраты на подразделения (сотрудники, отделы)
-        _divisions = calculate_expenses_by_divisions(
-            float(self.ui.le_personal.text()),
-            float(self.ui.le_divisions_cost.text()),
-            float(self.ui.le_subscription.text()))
-        # Считаем затраты по номерам
-        _phones = calculate_expenses_by_numbers2(self.call_history,
-                                                 float(self.ui.le_cost_for_number.text()),
-                                                 float(self.ui.le_minuts.text()))
-#        print(_phones)
-        _final = _divisions.merge(_phones, on='id')
+        costs = (float(self.ui.le_personal.text()),
+                 float(self.ui.le_divisions_cost.text()),
+                 float(self.ui.le_subscription.text()),
+                 float(self.ui.le_cost_for_number.text()),
+                 float(self.ui.le_minuts.text()))
+        call_history = self.call_history
+        self.ui.btn_calculate.setEnabled(False)
+
+        def calculate(worker):
+            with PROFILER.stage('calculate'):
+                report = build_report(call_history, *costs)
+            PROFILER.record_size('to_model', report)
+            return report, call_history
+
+        self.run_task('calculate', calculate, self.calculated, 'Расчет...', 'Ошибка при расчете!',
+                      lambda: self.ui.btn_calculate.setEnabled(True))
+
+    def calculated(self, result):
+        # Звонки, по которым посчитан отчет, сохраняются вместе с ним
+        report, self.report_calls = result
+        self.ui.btn_calculate.setEnabled(True)
         self.ui.tableView.horizontalHeader().setStretchLastSection(True)
         self.ui.tableView.setAlternatingRowColors(True)
         self.ui.tableView.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
-        _final['total'] = _final['cost_for_employees'] + \
-                          _final['cost_for_departments'] + \
-                          _final['cost_for_subscription'] + \
-                          _final['cost_for_calls'] + \
-                          _final['cost_for_numbers']
-        self.to_model = _final[['name', 'cost_for_employees', 'cost_for_departments', 'cost_for_subscription',
-                                'cost_for_calls', 'cost_for_numbers', 'total']]
-        self.to_model.columns = ['Отдел', 'Сотрудники', 'Отделы', 'Абонентка', 'Звонки', 'Номера', 'Общая сумма']
-        model = PandasModel(self.to_model)
-        self.ui.tableView.setModel(model)
+        self.to_model = report
+        with span('model', rows=len(report)):
+            # Все столбцы отчета, кроме названия отдела, суммы в рублях
+            model = PandasModel(self.to_model, money_columns=self.to_model.columns[1:])
+            self.ui.tableView.setModel(model)
+        self.filter_report(self.le_report_filter.text())
         # self.tableWidget.resizeRowsToContents()
         self.ui.tableView.resizeColumnsToContents()
         self.ui.btn_save_report.setEnabled(True)
+        self.btn_division_files.setEnabled(True)
+        self.show_reference_error()
 
     def from_invoice(self):
         path = QFileDialog.getOpenFileName(
@@ -178,41 +280,172 @@ class Window(QMainWindow):
             "PDF (*.pdf)"
         )
         if path[0]:
-            table = parse_pdf(path[0])
-            divisions_cost = 0
-            personal_cost = 0
-            subscription_cost = 0
-            minutes_cost = 0
-            for row in table:
-                value = row[1].replace(',', '.').replace(' ', '')
-                if 'Дополнительная группа пользователей' in row[0]:
-                    divisions_cost += float(value)
-                if 'Дополнительные внутренние номера' in row[0]:
-                    personal_cost += float(value)
-                if 'Безлимитная запись' in row[0] or \
-                        'ОАТС Про' in row[0] or \
-                        'Интеграция с CRM' in row[0] or \
-                        'Алгоритм распред' in row[0]:
-                    subscription_cost += float(value)
-                if 'Минут' in row[0] or 'Соединения по сети передачи данных' in row[0]:
-                    minutes_cost += float(value)
-            self.ui.le_divisions_cost.setText(str(round(divisions_cost, 2)))
-            self.ui.le_personal.setText(str(round(personal_cost, 2)))
-            self.ui.le_subscription.setText(str(round(subscription_cost, 2)))
-            self.ui.le_minuts.setText(str(round(minutes_cost, 2)))
+            self.run_task('invoice', lambda worker: costs_from_invoice(path[0]), self.invoice_parsed,
+                          'Чтение счета...', 'Ошибка при чтении счета!')
+
+    def import_invoices(self):
+        path = QFileDialog.getExistingDirectory(self.ui.centralwidget, "Папка со счетами")
+        if path:
+            from invoice_store import import_invoice_folder
+            self.run_task('invoices', lambda worker: import_invoice_folder(path, store=self.stored_invoices()),
+                          self.invoices_imported, 'Загрузка счетов...', 'Ошибка при загрузке счетов!')
+
+    def invoices_imported(self, result):
+        self.fill_stored_costs()
+        self.ui.statusbar.showMessage(f'Загружено счетов: {len(result["imported"])}, '
+                                      f'уже были загружены: {result["skipped"]}, без месяца: {len(result["no_month"])}, '
+                                      f'нераспознанных строк: {result["unmatched"]}')
+
+    def stored_invoices(self):
+        if self.invoice_store is None:
+            # Хранилище счетов открывается после показа окна, pdfplumber и pyarrow не замедляют запуск
+            from invoice_store import InvoiceStore
+            self.invoice_store = InvoiceStore()
+        return self.invoice_store
+
+    def selected_month(self):
+        """First day of month of the selected period"""
+        if self.custom_dates:
+            return self.ui.start_date.date().toPython().replace(day=1)
+        return period_bounds(self.periods[self.period])[0].date().replace(day=1)
+
+    def fill_stored_costs(self, *args):
+        """Fill costs of the selected month from imported invoices, fields are kept when month has none"""
+        costs = self.stored_invoices().costs(self.selected_month())
+        if costs is not None:
+            self.invoice_parsed(costs)
+
+    def invoice_parsed(self, costs):
+        self.ui.le_divisions_cost.setText(str(round(costs['divisions'], 2)))
+        self.ui.le_personal.setText(str(round(costs['personal'], 2)))
+        self.ui.le_subscription.setText(str(round(costs['subscription'], 2)))
+        self.ui.le_minuts.setText(str(round(costs['minutes'], 2)))
+        if len(costs.get('unmatched', ())):
+            names = ', '.join(costs['unmatched']['name'])
+            self.ui.statusbar.showMessage(f'Не распознано строк счета: {len(costs["unmatched"])}: {names}')
 
     def request_from_api(self):
-        try:
-            if self.custom_dates:
-                start_date = self.ui.start_date.date().toString('yyyyMMdd') + 'T000000Z'
-                end_date = self.ui.end_date.date().toString('yyyyMMdd') + 'T235959Z'
-                self.call_history = request_history(start_date_=start_date, end_date=end_date, period='')
-            else:
-                self.call_history = request_history(period=self.periods[self.period])
-            self.ui.btn_calculate.setEnabled(True)
-        except Exception:
+        if self.custom_dates:
+            start_date = self.ui.start_date.date().toString('yyyyMMdd') + 'T000000Z'
+            end_date = self.ui.end_date.date().toString('yyyyMMdd') + 'T235959Z'
+            params = dict(start_date_=start_date, end_date=end_date, period='')
+        else:
+            params = dict(period=self.periods[self.period])
+
+        def fetch(worker):
+            # Справочник без сотрудников из CRM запрашивается заново вместе со звонками
+            REFERENCE.retry_failed()
+            REFERENCE.divisions
+            with PROFILER.stage('request'):
+                call_history = request_history(progress=lambda done, total: worker.report(f'Запрос: {done} из {total}'),
+                                               cancelled=worker.is_cancelled, **params)
+            PROFILER.record_size('call_history', call_history)
+            worker.check()
+            with span('index'):
+                return call_history, CallIndex(REFERENCE.number_index, call_history)
+
+        if self.run_task('request', fetch, self.history_received, 'Запрос...', 'Ошибка при запросе, повторите позже!',
+                         self.request_failed):
             self.ui.btn_calculate.setEnabled(False)
-            self.ui.statusbar.showMessage('Ошибка при запросе, повторите позже!', 2000)
+
+    def read_statistic(self):
+        """Calls from a folder of DomRu Excel exports instead of CRM"""
+        path = QFileDialog.getExistingDirectory(self.ui.centralwidget, "Папка со статистикой")
+        if not path:
+            return
+
+        def read(worker):
+            call_history = statistic_calls(read_tel_statistic_folder(path))
+            return call_history, CallIndex(REFERENCE.number_index, call_history)
+
+        # Имя задачи как у запроса: звонки из CRM и из статистики не загружаются одновременно
+        if self.run_task('request', read, self.statistic_read, 'Чтение статистики...',
+                         'Ошибка при чтении статистики!', self.request_failed):
+            self.ui.btn_calculate.setEnabled(False)
+
+    def statistic_read(self, result):
+        self.history_received(result)
+        self.ui.statusbar.showMessage(f'Звонков из статистики: {len(result[0])}. {get_statistic_cache().status()}')
+
+    def history_received(self, result):
+        self.call_history, self.call_index = result
+        self.ui.btn_calculate.setEnabled(True)
+        self.divisions = REFERENCE.divisions
+        self.show_reference_error()
+
+    def drill_down(self, index):
+        """Open calls of division from the double-clicked report row"""
+        if self.call_index is None:
+            self.ui.statusbar.showMessage('Сначала запросите звонки', 2000)
+            return
+        name = index.model().data(index.siblingAtColumn(0), Qt.DisplayRole)
+        divisions = REFERENCE.divisions
+        _id = divisions[divisions.name == name].iloc[0]['id']
+        call_history, rows = self.call_history, self.call_index.rows(_id)
+        self.run_task(f'drilldown {_id}', lambda worker: division_details(call_history, rows),
+                      lambda details: DrillDownDialog(name, *details, parent=self).show(),
+                      'Загрузка звонков...', 'Ошибка при загрузке звонков!')
+
+    def request_failed(self):
+        self.ui.btn_calculate.setEnabled(False)
+
+    def run_task(self, name, fn, finished, message, error_message, failed=None):
+        """
+        Run fn(worker) in background, repeated start of a running task is ignored
+        :return: True if the task was started
+        """
+        if self.tasks.is_running(name):
+            self.ui.statusbar.showMessage('Задача уже выполняется', 2000)
+            return False
+
+        started = TRACER.mark()
+
+        def on_finished(result):
+            self.task_done()
+            finished(result)
+            self.show_timing(started)
+
+        def on_failed(error):
+            self.task_done()
+            self.ui.statusbar.showMessage(error_message, 2000)
+            if failed is not None:
+                failed()
+
+        def on_cancelled():
+            self.task_done()
+            self.ui.statusbar.showMessage('Отменено', 2000)
+            if failed is not None:
+                failed()
+
+        self.tasks.start(name, fn, on_finished, on_failed, self.ui.statusbar.showMessage, on_cancelled)
+        self.ui.statusbar.showMessage(message)
+        self.btn_cancel.setVisible(True)
+        return True
+
+    def show_timing(self, started):
+        """Time and memory of stages of the finished task in the status bar"""
+        if TRACER.enabled:
+            text = TRACER.summary_text(started)
+            self.lbl_timing.setText(text)
+            self.lbl_timing.setToolTip(text)
+        if PROFILER.enabled:
+            self.lbl_memory.setText(PROFILER.last_text())
+            self.lbl_memory.setToolTip(PROFILER.report())
+
+    def save_trace(self):
+        path = QFileDialog.getSaveFileName(self.ui.centralwidget, "Сохранить трассировку", 'trace.json',
+                                           "Chrome trace (*.json)")
+        if path[0]:
+            TRACER.write_chrome_trace(path[0])
+            self.ui.statusbar.showMessage(f'Трассировка сохранена: {len(TRACER.spans)} этапов', 2000)
+
+    def task_done(self):
+        self.ui.statusbar.clearMessage()
+        self.btn_cancel.setVisible(bool(self.tasks.running))
+
+    def cancel_tasks(self):
+        self.tasks.cancel_all()
+        self.ui.statusbar.showMessage('Отмена...')
 
     def enable_dates(self, text):
         self.period = text
@@ -228,234 +461,10 @@ class Window(QMainWindow):
             self.ui.end_date.setEnabled(False)
 
 
-def request_history(start_date_='', end_date='', period='last_month'):
-    with open(r'config/cfg.json', 'r') as f:
-        text = json.load(f)
-    token = text['token']
-    path_to_api = text['path_to_api']
-    json_history = '/crmapi/v1/history/json'
-    headers = {'X-API-KEY': token}
-    params = {'type': 'out'}
-    if start_date_ != '':
-        params['start'] = start_date_
-    if end_date != '':
-        params['end'] = end_date
-    if period != '':
-        params['period'] = period
-    r = requests.get(path_to_api + json_history, headers=headers, params=params)
-    df = pd.json_normalize(r.json())
-    return df.query('status == "success"')
-
-
-def calc_emp_by_divisions():
-    with open(r'config/cfg.json', 'r') as f:
-        text = json.load(f)
-    token = text['token']
-    path_to_api = text['path_to_api']
-    json_users = '/crmapi/v1/users'
-    headers = {'X-API-KEY': token}
-    r = requests.get(path_to_api + json_users, headers=headers)
-    users = json.loads(r.text)
-    total_users = users['info']['limit']
-    pronina = 0
-    for user in users['items']:
-       if (user['ext'][0] == '4'):
-           pronina += 1
-    return pronina, total_users
-
-
-def to_seconds(val):
-    val = str(val).split(':')
-    return int(val[0]) * 3600 + int(val[1]) * 60 + int(val[2])
-
-
-def read_tel_excel_statistic(path):
-    """ Read raw data from Excel file
-        :return Pandas dataset with columns:
-            date: Date and time of the call
-            type: type of the traffic such as:
-                Входящие телефонные звонки
-                Исходящие местные телефонные звонки
-                Исходящие телефонные звонки
-            number: telephone number
-            duration: duration of the call
-            caller: telephone number of another side
-            region: region of another side
-    """
-    # Read ALL files in PATH_TO_STATISTIC folder
-    df = pd.read_excel(path, skiprows=[0, 1, 2, 3, 4, 5, 6, 7, 8], dtype={'Через': 'str'})
-    # Drop duplicates
-    df.drop_duplicates(inplace=True)
-    df['duration'] = df['Длительность'].apply(to_seconds)
-
-    # Make new dataset with necessary columns
-    db = df[['Дата', 'Тип звонка', 'Через', 'duration',
-             'Клиент']]
-    # Rename columns
-    db.columns = ['date', 'type', 'number', 'duration', 'caller']
-    # Change type of column 'number'
-    #    db['number'] = db['number'].astype('str')
-    return db
-
-
-def load_divisions():
-    """
-    Read information about divisions
-    :return: dataframe with divisions
-    """
-    pronina, total = calc_emp_by_divisions()
-    df = pd.read_csv(r'config/divisions.csv', sep=';')
-    index_to_change = df[df['name'] == 'Пронина'].index[0]
-    df.at[index_to_change, 'employees'] = pronina
-    if df.employees.sum() != total:
-        print ('somthing wrong with employees')
-    return df
-
-
-def filter_by_date(df, _start_date, _end_date):
-    """
-    :param df: dataframe to filter
-    :param _start_date: first day of period
-    :param _end_date: last day of period
-    :return: filtered dataframe from start
-    """
-    delta_to_the_end_of_day = datetime.timedelta(hours=23, minutes=59, seconds=59)
-    return df.loc[(df['date'] >= _start_date) & (df['date'] <= _end_date + delta_to_the_end_of_day)]
-
-
-def filter_outcome_calls(df):
-    """
-    Returns dataframe with only outgoing calls
-    :param df: dataframe to be filtered
-    :return: dataframe with only outgoing calls
-    """
-    return df[df.type.str.contains('Исходящие')]
-
-
-def calc_price_sec(df, total_cost):
-    """
-    Calculate cost of 1 second
-    :param df: dataframe with all outgoing calls
-    :param total_cost: total cost for all calls
-    :return: cost of 1 second
-    """
-    return total_cost / df.duration.sum()
-
-
-def get_phones():
-    """
-    Read from csv information about all telephone numbers
-    :return: dataframe with phones and divisions
-    """
-    _phones = pd.read_csv(r'config/phones.csv', sep=';')
-    _phones['number'] = _phones['number'].astype('str')
-    return _phones
-
-
-def calc_phones_cost_to_division(df=get_phones(), cost_per_number=160):
-    """
-    Calculate cost for numbers for division
-    :param df: dataframe with numbers and divisions
-    :param cost_per_number: cost for one number
-    :return: dataframe group by division with total cost for it
-    """
-    temp = df.division_id.value_counts().reset_index()
-    temp.columns = ['division_id', 'cost_for_number']
-    temp.cost_for_number = temp.cost_for_number * cost_per_number
-    return temp
-
-
-def calc_employee_cost(df=load_divisions(), total_cost=10000.0):
-    return round(total_cost / df.employees.sum(), 2)
-
-
-def calculate_sum_for_employees(df=load_divisions(), total_cost=10000.0):
-    emp = calc_employee_cost(df, total_cost)
-    df['cost_for_employees'] = df['employees'] * emp
-
-
-def calc_department_cost(df=load_divisions(), total_cost=900):
-    return round(total_cost / df.departments.sum(), 2)
-
-
-def calc_sum_for_departments(df=load_divisions(), total_cost=900):
-    dep = calc_department_cost(df, total_cost)
-    df['cost_for_departments'] = df['departments'] * dep
-
-
-def calc_subscription_cost(df=load_divisions(), total_cost=900):
-    return total_cost / df.id.count()
-
-
-def calc_subscription_sum_by_departments(df=load_divisions(), total_cost=4500):
-    sub = calc_subscription_cost(df, total_cost)
-    df['cost_for_subscription'] = round(sub, 2)
-
-
-def calculate_expenses_by_divisions(employees_cost=10160.97, departments_cost=900, subscription_fee=4500,
-                                    divisions=load_divisions()):
-    calculate_sum_for_employees(divisions, employees_cost)
-    calc_sum_for_departments(divisions, departments_cost)
-    calc_subscription_sum_by_departments(divisions, subscription_fee)
-    return divisions
-
-
-def calc_calls_duration():
-    pass
-
-
-def calculate_expenses_by_numbers2(call_history, number_cost, conversation_cost, phones=get_phones()):
-    #    global CALL_HISTORY
-    phones_cost = calc_phones_cost_to_division(phones, number_cost)
-    #    if CALL_HISTORY.empty:
-    #        return None
-    # Группируем по номеру телефона
-    number_seconds = call_history.groupby('diversion').duration.sum().reset_index()
-    number_seconds.rename(columns={"diversion": "number"}, inplace=True)
-    phone_division = phones.merge(number_seconds, on='number')
-    # Группируем по подразделению и считаем общую сумму разговоров
-    division_duration = phone_division.groupby('division_id').duration.sum().reset_index()
-    # Считаем стоимость секунды
-    sec_cost = calc_price_sec(division_duration, conversation_cost)
-    # Пишем столбец со стоимостью разговоров для подразделения
-    division_duration['cost_for_calls'] = round(division_duration['duration'].astype(int) * sec_cost, 2)
-    # Получаем датафрейм со стоимостью звонков и номеров телефона
-    merged = division_duration.merge(phones_cost, on='division_id')
-    merged.columns = ['id', 'duration', 'cost_for_calls', 'cost_for_numbers']
-    return merged
-
-
-# def calculate_expenses_by_numbers(number_cost, start_date, end_date, conversation_cost, phones=get_phones()):
-#     phones_cost = calc_phones_cost_to_division(phones, number_cost)
-#     calls_statistic = read_tel_statistic()
-#     filtered_by_dates_calls_statistics = \
-#         filter_by_date(df=calls_statistic, _start_date=start_date, _end_date=end_date).sort_values('date')
-#     # Фильтруем по направлениям звонков
-#     outgoing_filtered_by_dates_calls_statistics = filter_outcome_calls(filtered_by_dates_calls_statistics)
-#     # Группируем по номеру телефона
-#     number_seconds = outgoing_filtered_by_dates_calls_statistics.groupby('number').duration.sum().reset_index()
-#     phone_division = phones.merge(number_seconds, on='number')
-#     # Группируем по подразделению и считаем общую сумму разговоров
-#     division_duration = phone_division.groupby('division_id').duration.sum().reset_index()
-#     # Считаем стоимость секунды
-#     sec_cost = calc_price_sec(division_duration, conversation_cost)
-#     # Пишем столбец со стоимостью разговоров для подразделения
-#     division_duration['cost_for_calls'] = round(division_duration['duration'].astype(int) * sec_cost, 2)
-#     # Получаем датафрейм со стоимостью звонков и номеров телефона
-#     merged = division_duration.merge(phones_cost, on='division_id')
-#     merged.columns = ['id', 'duration', 'cost_for_calls', 'cost_for_numbers']
-#     return merged
-
-
-def parse_pdf(path_to_pdf_file):
-    with pdfplumber.open(path_to_pdf_file) as pdf:
-        page = pdf.pages[0]
-        table = page.extract_table()
-    return table
-
-
 # Press the green button in the gutter to run the script.
 if __name__ == '__main__':
+    # Для exe из PyInstaller: дочерние процессы ProcessPoolExecutor не должны запускать окно
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     widget = Window()
     widget.show()
@@ -0,0 +1,176 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Мест выделения памяти в отчете по этапу
+TOP_SITES = 10
+
+
+def _windows_memory_counters():
+    """PROCESS_MEMORY_COUNTERS of this process from GetProcessMemoryInfo, None on error"""
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters),
+                                                 wintypes.DWORD]
+    if not kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+        return None
+    return counters
+
+
+def peak_rss_bytes():
+    """Peak working set of this process on Windows, None elsewhere"""
+    if sys.platform != 'win32':
+        return None
+    try:
+        counters = _windows_memory_counters()
+    except (OSError, AttributeError):
+        return None
+    return None if counters is None else counters.PeakWorkingSetSize
+
+
+def rss_bytes():
+    """Resident set size of this process: /proc on Linux, working set on Windows, None elsewhere"""
+    if sys.platform == 'win32':
+        try:
+            counters = _windows_memory_counters()
+        except (OSError, AttributeError):
+            return None
+        return None if counters is None else counters.WorkingSetSize
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+def frame_bytes(df):
+    """Memory of dataframe with index and Python objects of string columns"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def _mib(value):
+    return None if value is None else round(value / 2 ** 20, 1)
+
+
+class MemoryProfiler:
+    """Opt-in memory accounting of pipeline stages: request, calculate, save
+
+    For every stage records tracemalloc peak above the memory held before it,
+    memory it kept, RSS delta and the lines which kept the most memory.
+    tracemalloc slows Python allocations down several times, so it is started
+    only when profiling is enabled by DOMRU_MEMORY=1, cli.py --memory or
+    enable(). tracemalloc does not see memory of pyarrow strings and other
+    native buffers, RSS delta does. Both count the whole process, stages
+    which run at the same time are counted together.
+    """
+
+    def __init__(self, enabled=False, top=TOP_SITES):
+        self.enabled = enabled
+        self.top = top
+        self.stages = []
+        self.sizes = {}
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    @contextmanager
+    def stage(self, name):
+        """Context manager measuring memory of its body"""
+        if not self.enabled:
+            yield
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        held = tracemalloc.get_traced_memory()[0]
+        rss = rss_bytes()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            rss_after = rss_bytes()
+            # compare_to сортирует по модулю разницы, освобожденная память нам не нужна
+            grown = sorted(after.compare_to(before, 'lineno'), key=lambda stat: stat.size_diff, reverse=True)
+            sites = [(str(stat.traceback[0]), stat.size_diff) for stat in grown[:self.top] if stat.size_diff >= 1024]
+            with self._lock:
+                self.stages.append({'stage': name,
+                                    'seconds': round(seconds, 3),
+                                    'peak_bytes': peak - held,
+                                    'kept_bytes': current - held,
+                                    'rss_delta_bytes': None if rss is None or rss_after is None else rss_after - rss,
+                                    'sites': sites})
+
+    def record_size(self, name, df):
+        """Remember size of dataframe, such as call_history or to_model"""
+        if self.enabled:
+            with self._lock:
+                self.sizes[name] = frame_bytes(df)
+
+    def clear(self):
+        with self._lock:
+            self.stages = []
+            self.sizes = {}
+
+    def stage_text(self, record):
+        """'request: peak 512.0 MiB, kept 120.3 MiB, RSS +130.1 MiB'"""
+        text = f'{record["stage"]}: peak {_mib(record["peak_bytes"])} MiB, kept {_mib(record["kept_bytes"])} MiB'
+        if record['rss_delta_bytes'] is not None:
+            text += f', RSS {_mib(record["rss_delta_bytes"]):+} MiB'
+        return text
+
+    def last_text(self):
+        """Memory of the last finished stage and sizes of data, empty string without stages"""
+        with self._lock:
+            if not self.stages:
+                return ''
+            text = self.stage_text(self.stages[-1])
+            sizes = ', '.join(f'{name} {_mib(size)} MiB' for name, size in self.sizes.items())
+        return f'{text}; {sizes}' if sizes else text
+
+    def report(self):
+        """Stages with their biggest allocation sites as text"""
+        lines = []
+        with self._lock:
+            for record in self.stages:
+                lines.append(self.stage_text(record))
+                lines += [f'    {size / 1024:>10,.0f} KiB  {site}' for site, size in record['sites']]
+            lines += [f'{name}: {_mib(size)} MiB' for name, size in self.sizes.items()]
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        with self._lock:
+            data = {'stages': self.stages, 'sizes': self.sizes}
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+        return path
+
+
+PROFILER = MemoryProfiler(enabled=os.environ.get('DOMRU_MEMORY', '') not in ('', '0'))
@@ -0,0 +1,142 @@
+import os
+import sys
+import threading
+
+import pandas as pd
+
+from aggregation import NumberIndex
+from invoice_classifier import InvoiceClassifier
+from tracing import span
+
+CONFIG_DIR = os.environ.get('DOMRU_CONFIG_DIR', 'config')
+CACHE_DIR = os.environ.get('DOMRU_CACHE_DIR', 'cache')
+
+
+class ReferenceData:
+    """Lazily loaded, memoized reference data: divisions, phones and users counts.
+
+    Nothing is read from disk or requested from CRM until the first access,
+    after that the same objects are shared by the GUI and every calculation.
+    """
+
+    def __init__(self, config_dir=None, client=None):
+        self.config_dir = config_dir or CONFIG_DIR
+        self.client = client
+        self._lock = threading.RLock()
+        self._phones = None
+        self._number_index = None
+        self._divisions = None
+        self._user_counts = None
+        self._invoice_classifier = None
+        # Последняя ошибка CRM, из-за которой сотрудники взяты из divisions.csv
+        self.user_counts_error = None
+
+    def path(self, name):
+        return os.path.join(self.config_dir, name)
+
+    @property
+    def phones(self):
+        """
+        Telephone numbers with divisions from phones.csv
+        :return: dataframe with columns number, division_id, description
+        """
+        with self._lock:
+            if self._phones is None:
+                with span('config', file='phones.csv'):
+                    _phones = pd.read_csv(self.path('phones.csv'), sep=';')
+                _phones['number'] = _phones['number'].astype('str')
+                self._phones = _phones
+            return self._phones
+
+    @property
+    def number_index(self):
+        """
+        Number -> division index of phones
+        :return: NumberIndex
+        """
+        with self._lock:
+            if self._number_index is None:
+                self._number_index = NumberIndex(self.phones)
+            return self._number_index
+
+    @property
+    def user_counts(self):
+        """
+        Users of Pronina division and total users limit from CRM
+        :return: tuple (pronina, total) or None if CRM is unreachable
+        """
+        with self._lock:
+            if self._user_counts is None:
+                from report import calc_emp_by_divisions
+                try:
+                    self._user_counts = calc_emp_by_divisions(self.client)
+                except Exception as e:
+                    print(f'CRM is unreachable, employees are taken from divisions.csv: {e}', file=sys.stderr)
+                    self.user_counts_error = e
+                    return None
+                self.user_counts_error = None
+            return self._user_counts
+
+    @property
+    def divisions(self):
+        """
+        Divisions from divisions.csv with employees of Pronina taken from CRM when it has such division.
+        When CRM is unreachable employees of divisions.csv are used until retry_failed()
+        :return: dataframe with columns id, name, employees, departments
+        """
+        with self._lock:
+            if self._divisions is None:
+                with span('config', file='divisions.csv'):
+                    df = pd.read_csv(self.path('divisions.csv'), sep=';')
+                rows = df.index[df['name'] == 'Пронина']
+                # У других юрлиц отдела Пронина нет, сотрудники берутся только из divisions.csv
+                counts = self.user_counts if len(rows) else None
+                if counts is not None:
+                    pronina, total = counts
+                    df.at[rows[0], 'employees'] = pronina
+                    if df.employees.sum() != total:
+                        print('somthing wrong with employees')
+                self._divisions = df
+            return self._divisions
+
+    @property
+    def invoice_classifier(self):
+        """
+        Rules of invoice line items from invoice_rules.csv, the common file is used when config_dir has none
+        :return: InvoiceClassifier
+        """
+        with self._lock:
+            if self._invoice_classifier is None:
+                path = self.path('invoice_rules.csv')
+                if not os.path.exists(path):
+                    path = os.path.join(CONFIG_DIR, 'invoice_rules.csv')
+                with span('config', file=path):
+                    self._invoice_classifier = InvoiceClassifier.from_csv(path)
+            return self._invoice_classifier
+
+    def retry_failed(self):
+        """Forget divisions loaded without CRM, next access asks CRM for users again"""
+        with self._lock:
+            if self.user_counts_error is not None:
+                self._divisions = None
+                self.user_counts_error = None
+
+    def preload(self, phones, divisions):
+        """Use already loaded phones and divisions, for example in worker processes"""
+        with self._lock:
+            self._phones = phones
+            self._number_index = None
+            self._divisions = divisions
+
+    def reload(self):
+        """Forget everything loaded, next access reads data again"""
+        with self._lock:
+            self._phones = None
+            self._number_index = None
+            self._divisions = None
+            self._user_counts = None
+            self._invoice_classifier = None
+            self.user_counts_error = None
+
+
+REFERENCE = ReferenceData()
@@ -0,0 +1,253 @@
+import datetime
+
+from aggregation import NumberIndex, aggregate_by_division
+from api_client import HISTORY, get_client
+from call_store import request_history_cached
+from history import CHUNK_SIZE, merge_calls, read_calls, request_history_windowed
+from reference import REFERENCE
+from tracing import traced
+
+
+@traced('request')
+def request_history(start_date_='', end_date='', period='last_month', window_days=None, progress=None,
+                    cancelled=None, client=None, store=None, numbers=None, refresh=False):
+    """
+    Request successful outgoing calls from CRM
+    :param window_days: split period into concurrent requests of window_days days,
+        by default taken from 'window_days' of cfg.json, 0 means one request for the whole period
+    :param progress: called with (done, total) requests
+    :param cancelled: returns True when the request must be stopped
+    :param client: CrmClient of account, shared client by default
+    :param store: CallStore of account, shared store by default
+    :param numbers: phone numbers of account, phones.csv of REFERENCE by default
+    :param refresh: request closed days of the local store again
+    :return: dataframe with calls
+    """
+    client = client or get_client()
+    if client.config.get('cache', True):
+        # Закрытые дни берем из локального хранилища, запрашиваем только недостающие
+        return request_history_cached(start_date_, end_date, period, client.config.get('max_workers', 8), store,
+                                      client, progress=progress, cancelled=cancelled, numbers=numbers,
+                                      refresh=refresh)
+    if window_days is None:
+        window_days = client.config.get('window_days', 0)
+    if window_days:
+        return request_history_windowed(start_date_, end_date, period, window_days,
+                                        client.config.get('max_workers', 8), client, progress=progress,
+                                        cancelled=cancelled, numbers=numbers)
+    params = {'type': 'out'}
+    if start_date_ != '':
+        params['start'] = start_date_
+    if end_date != '':
+        params['end'] = end_date
+    if period != '':
+        params['period'] = period
+    with client.get(HISTORY, params, stream=True) as response:
+        return merge_calls([read_calls(response.iter_content(CHUNK_SIZE))], numbers)
+
+
+def calc_emp_by_divisions(client=None):
+    users = (client or get_client()).users()
+    total_users = users['info']['limit']
+    pronina = 0
+    for user in users['items']:
+       if (user['ext'][0] == '4'):
+           pronina += 1
+    return pronina, total_users
+
+
+def load_divisions():
+    """
+    Read information about divisions
+    :return: dataframe with divisions
+    """
+    return REFERENCE.divisions
+
+
+def filter_by_date(df, _start_date, _end_date):
+    """
+    :param df: dataframe to filter
+    :param _start_date: first day of period
+    :param _end_date: last day of period
+    :return: filtered dataframe from start
+    """
+    delta_to_the_end_of_day = datetime.timedelta(hours=23, minutes=59, seconds=59)
+    return df.loc[(df['date'] >= _start_date) & (df['date'] <= _end_date + delta_to_the_end_of_day)]
+
+
+def filter_outcome_calls(df):
+    """
+    Returns dataframe with only outgoing calls
+    :param df: dataframe to be filtered
+    :return: dataframe with only outgoing calls
+    """
+    return df[df.type.str.contains('Исходящие')]
+
+
+def calc_price_sec(df, total_cost):
+    """
+    Calculate cost of 1 second
+    :param df: dataframe with all outgoing calls
+    :param total_cost: total cost for all calls
+    :return: cost of 1 second
+    """
+    return total_cost / df.duration.sum()
+
+
+def get_phones():
+    """
+    Read from csv information about all telephone numbers
+    :return: dataframe with phones and divisions
+    """
+    return REFERENCE.phones
+
+
+def calc_phones_cost_to_division(df=None, cost_per_number=160):
+    """
+    Calculate cost for numbers for division
+    :param df: dataframe with numbers and divisions
+    :param cost_per_number: cost for one number
+    :return: dataframe group by division with total cost for it
+    """
+    if df is None:
+        df = REFERENCE.phones
+    temp = df.division_id.value_counts().reset_index()
+    temp.columns = ['division_id', 'cost_for_number']
+    temp.cost_for_number = temp.cost_for_number * cost_per_number
+    return temp
+
+
+def calc_employee_cost(df=None, total_cost=10000.0):
+    if df is None:
+        df = REFERENCE.divisions
+    return round(total_cost / df.employees.sum(), 2)
+
+
+def calculate_sum_for_employees(df=None, total_cost=10000.0):
+    if df is None:
+        df = REFERENCE.divisions
+    emp = calc_employee_cost(df, total_cost)
+    df['cost_for_employees'] = df['employees'] * emp
+
+
+def calc_department_cost(df=None, total_cost=900):
+    if df is None:
+        df = REFERENCE.divisions
+    return round(total_cost / df.departments.sum(), 2)
+
+
+def calc_sum_for_departments(df=None, total_cost=900):
+    if df is None:
+        df = REFERENCE.divisions
+    dep = calc_department_cost(df, total_cost)
+    df['cost_for_departments'] = df['departments'] * dep
+
+
+def calc_subscription_cost(df=None, total_cost=900):
+    if df is None:
+        df = REFERENCE.divisions
+    return total_cost / df.id.count()
+
+
+def calc_subscription_sum_by_departments(df=None, total_cost=4500):
+    if df is None:
+        df = REFERENCE.divisions
+    sub = calc_subscription_cost(df, total_cost)
+    df['cost_for_subscription'] = round(sub, 2)
+
+
+@traced('divisions')
+def calculate_expenses_by_divisions(employees_cost=10160.97, departments_cost=900, subscription_fee=4500,
+                                    divisions=None):
+    if divisions is None:
+        divisions = REFERENCE.divisions.copy()
+    calculate_sum_for_employees(divisions, employees_cost)
+    calc_sum_for_departments(divisions, departments_cost)
+    calc_subscription_sum_by_departments(divisions, subscription_fee)
+    return divisions
+
+
+def calc_calls_duration():
+    pass
+
+
+def calculate_expenses_by_numbers2(call_history, number_cost, conversation_cost, phones=None):
+    """
+    Calculate cost of calls and numbers for divisions
+    :param call_history: dataframe with diversion and duration of calls
+    :param number_cost: cost for one number
+    :param conversation_cost: total cost for all calls
+    :param phones: dataframe with numbers and divisions, phones.csv by default
+    :return: dataframe with columns id, duration, cost_for_calls, cost_for_numbers
+    """
+    index = REFERENCE.number_index if phones is None else NumberIndex(phones)
+    return aggregate_by_division(index, call_history, number_cost, conversation_cost)
+
+
+# def calculate_expenses_by_numbers(number_cost, start_date, end_date, conversation_cost, phones=get_phones()):
+#     phones_cost = calc_phones_cost_to_division(phones, number_cost)
+#     calls_statistic = read_tel_statistic()
+#     filtered_by_dates_calls_statistics = \
+#         filter_by_date(df=calls_statistic, _start_date=start_date, _end_date=end_date).sort_values('date')
+#     # Фильтруем по направлениям звонков
+#     outgoing_filtered_by_dates_calls_statistics = filter_outcome_calls(filtered_by_dates_calls_statistics)
+#     # Группируем по номеру телефона
+#     number_seconds = outgoing_filtered_by_dates_calls_statistics.groupby('number').duration.sum().reset_index()
+#     phone_division = phones.merge(number_seconds, on='number')
+#     # Группируем по подразделению и считаем общую сумму разговоров
+#     division_duration = phone_division.groupby('division_id').duration.sum().reset_index()
+#     # Считаем стоимость секунды
+#     sec_cost = calc_price_sec(division_duration, conversation_cost)
+#     # Пишем столбец со стоимостью разговоров для подразделения
+#     division_duration['cost_for_calls'] = round(division_duration['duration'].astype(int) * sec_cost, 2)
+#     # Получаем датафрейм со стоимостью звонков и номеров телефона
+#     merged = division_duration.merge(phones_cost, on='division_id')
+#     merged.columns = ['id', 'duration', 'cost_for_calls', 'cost_for_numbers']
+#     return merged
+
+
+@traced('calculate')
+def build_report(call_history, personal_cost, departments_cost, subscription_fee, number_cost, minutes_cost,
+                 reference=None):
+    """
+    Calculate expenses of every division
+    :param reference: ReferenceData of account, shared REFERENCE by default
+    :return: dataframe with report columns
+    """
+    reference = reference or REFERENCE
+    # Считаем затраты на подразделения (сотрудники, отделы)
+    _divisions = calculate_expenses_by_divisions(personal_cost, departments_cost, subscription_fee,
+                                                 reference.divisions.copy())
+    # Считаем затраты по номерам
+    _phones = aggregate_by_division(reference.number_index, call_history, number_cost, minutes_cost)
+    _final = _divisions.merge(_phones, on='id')
+    _final['total'] = _final['cost_for_employees'] + \
+                      _final['cost_for_departments'] + \
+                      _final['cost_for_subscription'] + \
+                      _final['cost_for_calls'] + \
+                      _final['cost_for_numbers']
+    report = _final[['name', 'cost_for_employees', 'cost_for_departments', 'cost_for_subscription',
+                     'cost_for_calls', 'cost_for_numbers', 'total']]
+    report.columns = ['Отдел', 'Сотрудники', 'Отделы', 'Абонентка', 'Звонки', 'Номера', 'Общая сумма']
+    return report
+
+
+def costs_from_invoice(path_to_pdf_file, reference=None):
+    """
+    Read costs from DomRu invoice
+    :param reference: ReferenceData with rules of line items, REFERENCE by default
+    :return: dict with divisions, personal, subscription and minutes costs,
+        unmatched is a dataframe of line items with amount that no rule matched
+    """
+    reference = reference or REFERENCE
+    costs, unmatched = reference.invoice_classifier.classify(parse_pdf(path_to_pdf_file))
+    # О нераспознанных строках сообщает вызывающий: CLI в stderr, окно в строке состояния
+    costs['unmatched'] = unmatched
+    return costs
+
+
+def parse_pdf(path_to_pdf_file):
+    """Rows of line items from all pages of invoice, see invoice_pdf.extract_invoice_rows"""
+    # pdfplumber и pyarrow загружаются долго, нужны только для счетов
+    from invoice_pdf import extract_invoice_rows
+    return extract_invoice_rows(path_to_pdf_file)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+
+import pyarrow.feather as feather
+
+from reference import CACHE_DIR
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class StatisticCache:
+    """Cache of parsed Excel exports keyed by file content hash
+
+    Frames are kept as uncompressed Feather files and memory-mapped on load.
+    Known files are checked by mtime and size first, the hash is computed
+    only for new or changed files. When the cache grows over max_bytes the
+    least recently used frames are removed.
+    """
+
+    def __init__(self, path=None, max_bytes=512 * 2 ** 20):
+        self.path = path or os.path.join(CACHE_DIR, 'statistics')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(self.path, 'index.json')
+        os.makedirs(self.path, exist_ok=True)
+        try:
+            with open(self._index_path, 'r') as f:
+                self._index = json.load(f)
+        except (OSError, ValueError):
+            self._index = {}
+
+    def _save_index(self):
+        tmp = self._index_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self._index_path)
+
+    def key(self, path):
+        """
+        Content hash of file, taken from index when mtime and size did not change
+        """
+        stat = os.stat(path)
+        name = os.path.abspath(path)
+        with self._lock:
+            known = self._index.get(name)
+        if known and known['mtime'] == stat.st_mtime and known['size'] == stat.st_size:
+            return known['hash']
+        digest = file_hash(path)
+        with self._lock:
+            self._index[name] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': digest}
+            self._save_index()
+        return digest
+
+    def _frame_path(self, key):
+        return os.path.join(self.path, key + '.feather')
+
+    def get(self, path):
+        """
+        :return: cached dataframe of file or None
+        """
+        frame_path = self._frame_path(self.key(path))
+        try:
+            df = feather.read_table(frame_path, memory_map=True).to_pandas()
+            os.utime(frame_path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return df
+
+    def put(self, path, df):
+        frame_path = self._frame_path(self.key(path))
+        try:
+            feather.write_feather(df, frame_path + '.tmp', compression='uncompressed')
+        except (TypeError, ValueError) as e:
+            # Столбцы со смешанными типами Arrow не сохраняет
+            print(f'Statistics of {path} is not cached: {e}')
+            return
+        os.replace(frame_path + '.tmp', frame_path)
+        self.evict()
+
+    def read(self, path, loader):
+        """
+        Cached frame of file, loader(path) is called on miss and its result is stored
+        """
+        df = self.get(path)
+        if df is None:
+            df = loader(path)
+            self.put(path, df)
+        return df
+
+    def evict(self):
+        """Remove least recently used frames while cache is larger than max_bytes"""
+        with self._lock:
+            frames = []
+            for name in os.listdir(self.path):
+                if name.endswith('.feather'):
+                    stat = os.stat(os.path.join(self.path, name))
+                    frames.append((stat.st_mtime, stat.st_size, name))
+            total = sum(size for _, size, _ in frames)
+            for _, size, name in sorted(frames):
+                if total <= self.max_bytes:
+                    break
+                os.remove(os.path.join(self.path, name))
+                total -= size
+
+    def status(self):
+        return f'Кэш статистики: попаданий {self.hits}, промахов {self.misses}'
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_statistic_cache():
+    """Shared cache of Excel statistics, created on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = StatisticCache()
+        return _cache
@@ -0,0 +1,176 @@
+"""Local stand-in for DomRu CRM API with injected latency
+
+Serves synthetic calls of numbers from config/phones.csv, so the GUI, cli.py
+and throughput benchmarks run without network:
+
+    python stub_server.py --port 8080 --calls 100000 --config offline
+    DOMRU_CONFIG_DIR=offline/config DOMRU_CACHE_DIR=offline/cache python main.py
+
+Offline runs need their own DOMRU_CACHE_DIR: recorded responses, statistic
+and invoice stores of cache/ must not mix with synthetic data.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_DATE_FORMAT = '%Y%m%dT%H%M%SZ'
+CALL_DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+def make_users(pronina=41, total=99):
+    items = [{'ext': '4%02d' % i} for i in range(pronina)]
+    items += [{'ext': '5%02d' % i} for i in range(total - pronina)]
+    return {'info': {'limit': total}, 'items': items}
+
+
+def make_history(n, start, days, numbers, seed=0):
+    """
+    Synthetic calls spread over days
+    :param n: number of calls
+    :param start: first day
+    :param days: number of days
+    :param numbers: phone numbers used as diversion
+    :return: list of calls as returned by /crmapi/v1/history/json
+    """
+    rnd = random.Random(seed)
+    calls = []
+    for i in range(n):
+        moment = start + datetime.timedelta(seconds=rnd.randrange(days * 86400))
+        calls.append({'uid': f'{i:012d}',
+                      'type': 'out',
+                      'status': 'success' if rnd.random() < 0.8 else 'missed',
+                      'client': '7' + str(rnd.randrange(10 ** 9, 10 ** 10)),
+                      'diversion': rnd.choice(numbers),
+                      'start': moment.strftime(CALL_DATE_FORMAT),
+                      'wait': rnd.randrange(30),
+                      'duration': rnd.randrange(1, 900)})
+    return calls
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    latency_per_call = 0.0
+    max_concurrent = 0
+    history = []
+    users = make_users()
+    active = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        with cls.lock:
+            cls.active += 1
+            throttled = self.max_concurrent and cls.active > self.max_concurrent
+        try:
+            if throttled:
+                self.send_response(429)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.answer()
+        finally:
+            with cls.lock:
+                cls.active -= 1
+
+    def answer(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == '/crmapi/v1/users':
+            body = self.users
+        elif url.path == '/crmapi/v1/history/json':
+            body = self.history
+            if 'start' in query and 'end' in query:
+                start = datetime.datetime.strptime(query['start'], API_DATE_FORMAT).strftime(CALL_DATE_FORMAT)
+                end = datetime.datetime.strptime(query['end'], API_DATE_FORMAT).strftime(CALL_DATE_FORMAT)
+                body = [call for call in body if start <= call['start'] <= end]
+        else:
+            self.send_error(404)
+            return
+        time.sleep(self.latency + self.latency_per_call * (len(body) if isinstance(body, list) else 0))
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency=0.0, history=None, users=None, port=0, latency_per_call=0.0, max_concurrent=0):
+    """
+    Start stand-in server in background thread
+    :param latency: delay in seconds before every response
+    :param history: list of calls returned by /crmapi/v1/history/json
+    :param users: body returned by /crmapi/v1/users
+    :param latency_per_call: extra delay for every call in the response
+    :param max_concurrent: answer 429 when more requests are in flight, 0 means no limit
+    :return: running server, base url is f'http://127.0.0.1:{server.server_port}'
+    """
+    handler = type('Handler', (StubHandler,), {'latency': latency,
+                                               'latency_per_call': latency_per_call,
+                                               'max_concurrent': max_concurrent,
+                                               'history': history if history is not None else [],
+                                               'users': users if users is not None else make_users(),
+                                               'active': 0,
+                                               'lock': threading.Lock()})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+REPO_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config')
+
+
+def make_config_dir(path, base_url):
+    """Copy csv files from repo config and write cfg.json pointing to base_url"""
+    os.makedirs(os.path.join(path, 'config'), exist_ok=True)
+    for name in ('phones.csv', 'divisions.csv', 'invoice_rules.csv'):
+        shutil.copy(os.path.join(REPO_CONFIG, name), os.path.join(path, 'config', name))
+    with open(os.path.join(path, 'config', 'cfg.json'), 'w') as f:
+        json.dump({'token': 'test', 'path_to_api': base_url}, f)
+
+
+def config_numbers():
+    with open(os.path.join(REPO_CONFIG, 'phones.csv'), encoding='utf-8-sig') as f:
+        return [row['number'] for row in csv.DictReader(f, delimiter=';')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for DomRu CRM API')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--calls', type=int, default=10000, help='calls from the first day of the last month')
+    parser.add_argument('--days', type=int, default=62, help='days the calls are spread over')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay before every response, s')
+    parser.add_argument('--latency-per-call', type=float, default=0.0, help='extra delay for every call, s')
+    parser.add_argument('--max-concurrent', type=int, default=0, help='answer 429 above this many requests')
+    parser.add_argument('--config', metavar='FOLDER', help='write FOLDER/config with cfg.json for this server')
+    args = parser.parse_args(argv)
+    start = (datetime.date.today().replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+    history = make_history(args.calls, datetime.datetime.combine(start, datetime.time.min), args.days,
+                           config_numbers())
+    server = start_server(args.latency, history, port=args.port, latency_per_call=args.latency_per_call,
+                          max_concurrent=args.max_concurrent)
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    if args.config:
+        make_config_dir(args.config, base_url)
+        print(f'Config for this server: DOMRU_CONFIG_DIR={os.path.join(args.config, "config")}')
+    print(f'CRM stand-in with {len(history)} calls at {base_url}, Ctrl+C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
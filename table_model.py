@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+def format_money(values):
+    """Format numbers as '12 345.67'"""
+    return [f'{v:,.2f}'.replace(',', ' ') if v == v else '' for v in values.tolist()]
+
+
+def format_datetime(values):
+    return pd.DatetimeIndex(values).strftime('%Y-%m-%d %H:%M:%S').fillna('').tolist()
+
+
+def naive_array(series):
+    """Values of column, datetimes with time zone are converted to naive UTC so they stay datetime64"""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        series = series.dt.tz_convert(None)
+    return series.to_numpy()
+
+
+def format_plain(values):
+    return [str(v) for v in values.tolist()]
+
+
+class PandasModel(QAbstractTableModel):
+    """A model to interface a Qt view with pandas dataframe
+
+    Data is kept as one NumPy array per column. Display strings are formatted
+    lazily by blocks of rows and cached, rows are handed to the view in batches
+    through canFetchMore/fetchMore. Sorting uses argsort permutations cached per
+    column, filtering keeps an array of visible row positions, data is never copied.
+    """
+    BLOCK = 256
+    BATCH = 10000
+
+    def __init__(self, dataframe: pd.DataFrame, parent=None, money_columns=()):
+        """
+        :param money_columns: names or positions of columns shown as '12 345.67'
+        """
+        QAbstractTableModel.__init__(self, parent)
+        self._dataframe = dataframe
+        self._columns = [str(column) for column in dataframe.columns]
+        self._arrays = [naive_array(dataframe.iloc[:, i]) for i in range(dataframe.shape[1])]
+        self._index = dataframe.index
+        money_columns = {self.column(column) for column in money_columns}
+        self._formatters = [format_money if i in money_columns else
+                            format_datetime if array.dtype.kind == 'M' else
+                            format_plain for i, array in enumerate(self._arrays)]
+        self._numeric = [array.dtype.kind in 'iuf' for array in self._arrays]
+        self._cache = {}
+        self._order = {}
+        self._sort = None
+        self._mask = None
+        self._rows = None
+        self._loaded = min(len(dataframe), self.BATCH)
+
+    def dataframe(self):
+        return self._dataframe
+
+    def column(self, column):
+        """Position of column given by position or name"""
+        return column if isinstance(column, int) else self._columns.index(str(column))
+
+    def _total(self):
+        return len(self._dataframe) if self._rows is None else len(self._rows)
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        """ Override method from QAbstractTableModel
+
+        Return count of rows handed to the view
+        """
+        if parent == QModelIndex():
+            return self._loaded
+
+        return 0
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        """Override method from QAbstractTableModel
+
+        Return column count of the pandas DataFrame
+        """
+        if parent == QModelIndex():
+            return len(self._columns)
+        return 0
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        if parent != QModelIndex():
+            return False
+        return self._loaded < self._total()
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(self.BATCH, self._total() - self._loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def display(self, row, column):
+        """Formatted value of cell, the whole block of rows is formatted at once"""
+        block = row // self.BLOCK
+        strings = self._cache.get((column, block))
+        if strings is None:
+            start = block * self.BLOCK
+            if self._rows is None:
+                values = self._arrays[column][start:start + self.BLOCK]
+            else:
+                values = self._arrays[column][self._rows[start:start + self.BLOCK]]
+            strings = self._formatters[column](values)
+            self._cache[(column, block)] = strings
+        return strings[row % self.BLOCK]
+
+    def data(self, index: QModelIndex, role=Qt.ItemDataRole):
+        """Override method from QAbstractTableModel
+
+        Return data cell from the pandas DataFrame
+        """
+        if not index.isValid():
+            return None
+
+        if role == Qt.DisplayRole:
+            return self.display(index.row(), index.column())
+
+        if role == Qt.TextAlignmentRole and self._numeric[index.column()]:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+
+        return None
+
+    def headerData(self, section: int, orientation: Qt.Orientation, role: Qt.ItemDataRole):
+        """Override method from QAbstractTableModel
+
+        Return dataframe index as vertical header data and columns as horizontal header data.
+        """
+        if role == Qt.DisplayRole:
+            if orientation == Qt.Horizontal:
+                return self._columns[section]
+
+            if orientation == Qt.Vertical:
+                return str(self._index[section if self._rows is None else self._rows[section]])
+
+        return None
+
+    def order(self, column):
+        """Ascending permutation of rows by column, computed once"""
+        order = self._order.get(column)
+        if order is None:
+            array = self._arrays[column]
+            if array.dtype.kind == 'O':
+                # Строки сортируем по кодам, это быстрее сравнения объектов
+                array = pd.factorize(array, sort=True, use_na_sentinel=False)[0]
+            order = np.argsort(array, kind='stable')
+            self._order[column] = order
+        return order
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Override method from QAbstractTableModel
+
+        Negative column restores order of the DataFrame.
+        """
+        column = self.column(column)
+        self._sort = None if column < 0 else (column, order)
+        self._update_rows()
+
+    def set_filter(self, mask=None):
+        """
+        Show only rows where mask is True
+        :param mask: boolean array of dataframe length or None to show all rows
+        """
+        self._mask = None if mask is None else np.asarray(mask, dtype=bool)
+        self._update_rows()
+
+    def mask_contains(self, column, text):
+        """Rows where column contains text, case is ignored"""
+        values = pd.Series(self._arrays[self.column(column)]).astype(str)
+        return values.str.contains(text, case=False, regex=False).to_numpy()
+
+    def mask_equals(self, column, value):
+        return self._arrays[self.column(column)] == value
+
+    def mask_at_least(self, column, value):
+        return self._arrays[self.column(column)] >= value
+
+    def _update_rows(self):
+        self.beginResetModel()
+        rows = None
+        if self._sort is not None:
+            rows = self.order(self._sort[0])
+            if self._sort[1] == Qt.DescendingOrder:
+                rows = rows[::-1]
+        if self._mask is not None:
+            rows = np.flatnonzero(self._mask) if rows is None else rows[self._mask[rows]]
+        self._rows = rows
+        self._cache = {}
+        self._loaded = min(self._total(), self.BATCH)
+        self.endResetModel()
@@ -0,0 +1,149 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Спанов в памяти, старые отбрасываются
+MAX_SPANS = 200000
+
+
+class _NoSpan:
+    """Span of disabled tracer, does nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Span:
+    __slots__ = ('tracer', 'name', 'args', 'start', 'end', 'thread')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.spans.append(self)
+        return False
+
+    def set(self, **args):
+        """Add arguments known only inside the span, such as number of rows"""
+        self.args.update(args)
+
+    @property
+    def seconds(self):
+        return (self.end - self.start) / 1e9
+
+
+class Tracer:
+    """Timing spans of pipeline stages
+
+    Disabled by default: span() then returns a shared object that does nothing,
+    so instrumented code pays one attribute check. Enabled by DOMRU_TRACE=1,
+    cli.py --trace or enable(). Spans are kept in memory and exported in
+    Chrome trace format, open it in chrome://tracing or ui.perfetto.dev.
+    """
+
+    def __init__(self, enabled=False, max_spans=MAX_SPANS):
+        self.enabled = enabled
+        self.spans = deque(maxlen=max_spans)
+        self._origin = time.perf_counter_ns()
+        self._threads = {}
+
+    def span(self, name, **args):
+        """
+        Context manager timing its body
+        :param name: stage name, spans of the same name are summed in summary
+        :param args: arguments shown in trace viewer
+        """
+        if not self.enabled:
+            return NO_SPAN
+        self._threads.setdefault(threading.get_ident(), threading.current_thread().name)
+        return Span(self, name, args)
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def clear(self):
+        self.spans.clear()
+
+    @staticmethod
+    def mark():
+        """Moment to pass to summary to get spans started after it"""
+        return time.perf_counter_ns()
+
+    def _since(self, since):
+        return [s for s in list(self.spans) if since is None or s.start >= since]
+
+    def summary(self, since=None):
+        """
+        Total time of every stage in order of the first start
+        :param since: value of mark(), all spans by default
+        :return: list of tuples (name, seconds, count)
+        """
+        totals = {}
+        for s in sorted(self._since(since), key=lambda s: s.start):
+            seconds, count = totals.get(s.name, (0.0, 0))
+            totals[s.name] = (seconds + s.seconds, count + 1)
+        return [(name, seconds, count) for name, (seconds, count) in totals.items()]
+
+    def summary_text(self, since=None):
+        """'request 3.21 с, http 2.90 с ×31, ...' or empty string without spans"""
+        return ', '.join(f'{name} {seconds:.2f} с' + (f' ×{count}' if count > 1 else '')
+                         for name, seconds, count in self.summary(since))
+
+    def chrome_trace(self, since=None):
+        """Spans as Chrome trace events, complete events with microsecond times"""
+        pid = os.getpid()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                  for tid, name in list(self._threads.items())]
+        events += [{'name': s.name, 'cat': 'domru', 'ph': 'X', 'pid': pid, 'tid': s.thread,
+                    'ts': (s.start - self._origin) / 1000, 'dur': (s.end - s.start) / 1000,
+                    'args': {key: str(value) for key, value in s.args.items()}}
+                   for s in self._since(since)]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self, path, since=None):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(since), f, ensure_ascii=False)
+        return path
+
+
+TRACER = Tracer(enabled=os.environ.get('DOMRU_TRACE', '') not in ('', '0'))
+
+
+def span(name, **args):
+    """Span of the shared tracer, see Tracer.span"""
+    return TRACER.span(name, **args)
+
+
+def traced(name):
+    """Decorator putting every call of function into a span"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return fn(*args, **kwargs)
+            with TRACER.span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
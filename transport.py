@@ -0,0 +1,70 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+
+import requests
+
+from reference import CACHE_DIR
+
+PASSTHROUGH = 'passthrough'
+RECORD = 'record'
+REPLAY = 'replay'
+MODES = (PASSTHROUGH, RECORD, REPLAY)
+
+
+def response_key(base_url, endpoint, params):
+    """Same key for the same API, endpoint and query whatever the order of params"""
+    query = sorted((str(key), str(value)) for key, value in (params or {}).items())
+    return hashlib.sha256(json.dumps([base_url, endpoint, query]).encode()).hexdigest()[:32]
+
+
+def replayed_response(body, url=None):
+    """Successful requests.Response with body already read, json() and iter_content() work as usual"""
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response._content_consumed = True
+    response.raw = io.BytesIO(body)
+    response.url = url
+    response.headers['Content-Type'] = 'application/json'
+    return response
+
+
+class ResponseArchive:
+    """Recorded CRM responses, one gzip file per endpoint and query
+
+    Files are cache/responses/<endpoint>/<key>.json.gz, a small .meta.json
+    next to each tells which query it answers. Token is never stored.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(CACHE_DIR, 'responses')
+
+    def file(self, base_url, endpoint, params):
+        folder = re.sub(r'\W+', '_', endpoint).strip('_') or 'root'
+        return os.path.join(self.path, folder, response_key(base_url, endpoint, params) + '.json.gz')
+
+    def load(self, base_url, endpoint, params):
+        """
+        :return: body of recorded response or None
+        """
+        try:
+            with gzip.open(self.file(base_url, endpoint, params), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def save(self, base_url, endpoint, params, body):
+        path = self.file(base_url, endpoint, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Во временный файл, чтобы прерванная запись не оставила обрезанный ответ
+        with gzip.open(path + '.tmp', 'wb', compresslevel=6) as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+        with open(path[:-len('.json.gz')] + '.meta.json', 'w', encoding='utf-8') as f:
+            json.dump({'api': base_url, 'endpoint': endpoint, 'params': params or {}, 'bytes': len(body)}, f,
+                      ensure_ascii=False)
+        return path
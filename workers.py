@@ -0,0 +1,90 @@
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+from history import Cancelled
+
+
+class WorkerSignals(QObject):
+    progress = Signal(str)
+    finished = Signal(object)
+    failed = Signal(str)
+    cancelled = Signal()
+
+
+class Worker(QRunnable):
+    """Runs fn(worker) in QThreadPool, result and errors come back through signals
+
+    fn may call worker.report(text) to show progress and worker.check() to stop
+    when the user pressed cancel.
+    """
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = WorkerSignals()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def is_cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled()
+
+    def report(self, text):
+        self.signals.progress.emit(text)
+
+    def run(self):
+        try:
+            result = self.fn(self)
+            self.check()
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+class TaskRunner:
+    """Starts workers by name, a second start of a running task is ignored"""
+
+    def __init__(self, pool=None):
+        self.pool = pool or QThreadPool.globalInstance()
+        self.running = {}
+
+    def is_running(self, name):
+        return name in self.running
+
+    def start(self, name, fn, finished=None, failed=None, progress=None, cancelled=None):
+        """
+        Start fn(worker) in background
+        :param name: name of task, only one task with the same name runs at a time
+        :return: started worker or None if the task is already running
+        """
+        if name in self.running:
+            return None
+        worker = Worker(fn)
+        self.running[name] = worker
+        if progress is not None:
+            worker.signals.progress.connect(progress)
+        for signal, slot in ((worker.signals.finished, finished),
+                             (worker.signals.failed, failed),
+                             (worker.signals.cancelled, cancelled)):
+            signal.connect(lambda *args, _slot=slot: self._done(name, worker, _slot, args))
+        self.pool.start(worker)
+        return worker
+
+    def _done(self, name, worker, slot, args):
+        if self.running.get(name) is worker:
+            del self.running[name]
+        if slot is not None:
+            slot(*args)
+
+    def cancel_all(self):
+        for worker in self.running.values():
+            worker.cancel()